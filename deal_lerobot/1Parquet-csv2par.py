@@ -1,28 +1,20 @@
 import pandas as pd
 import os
+import csv
 import numpy as np
-from scipy.spatial.transform import Rotation as R
 import argparse
 import json  # 用于读取 bbox.jsonl
+from concurrent.futures import ProcessPoolExecutor
 
+import pyarrow.parquet as pq
 
-# ------------------- quaternion 工具 -------------------
-def quat_normalize(q):
-    q = np.array(q, dtype=float)
-    n = np.linalg.norm(q)
-    if n == 0:
-        return q
-    return q / n
-
-
-def quat_mul(a, b):
-    aw, ax, ay, az = a
-    bw, bx, by, bz = b
-    w = aw * bw - ax * bx - ay * by - az * bz
-    x = aw * bx + ax * bw + ay * bz - az * by
-    y = aw * by - ax * bz + ay * bw + az * bx
-    z = aw * bz + ax * by - ay * bx + az * bw
-    return np.array([w, x, y, z], dtype=float)
+from state_engine import relative_states, next_state_actions
+from parquet_io import CONSOLIDATED_DIR, build_fixed_table, consolidate_episodes, patch_columns, read_columns
+from manifest import check_inputs, load_manifest, save_manifest
+from frame_sampling import SOURCE_FPS, sampled_length, sample_indices, variant_fps, variant_name
+from raw_loader import load_raw_episode
+from stats_utils import feature_stats
+from task_registry import TASK_REGISTRY_FILE, TaskRegistry
 
 
 # ------------------- 命令行参数解析 -------------------
@@ -32,48 +24,79 @@ def parse_args():
                         help='父文件夹路径')
     parser.add_argument('--output_root', required=True,
                         help='输出根目录路径')
+    parser.add_argument('--sample_intervals', type=int, nargs='+', default=[2],
+                        help='下采样步长，可给多个（如 1 2 4）。每个 CSV 只读一次，'
+                             '多个步长时分别写到 output_root/<fps>hz/ 下')
+    parser.add_argument('--chunks_size', type=int, default=1000,
+                        help='每个 chunk-XXX 目录最多放多少个 episode（episode i 放在 chunk i // chunks_size）')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='并行转换的进程数（1 为串行，结果与并行逐字节一致）')
+    parser.add_argument('--list_layout', choices=['object', 'fixed'], default='object',
+                        help='state/action/bbox 的存储方式：object=pandas list 列，'
+                             'fixed=Arrow FixedSizeList<float32>')
+    parser.add_argument('--incremental', action='store_true',
+                        help='根据 meta/conversion_manifest.json 只重新转换输入有变化的 episode')
+    parser.add_argument('--consolidated', action='store_true',
+                        help='在逐 episode 文件之外，额外写出合并布局 data/consolidated/'
+                             '（每个 episode 一个 row group + episode_offsets.json）')
+    parser.add_argument('--consolidated_rows', type=int, default=1_000_000,
+                        help='合并布局中单个 parquet 文件的最大行数')
+    parser.add_argument('--task_registry', default=None,
+                        help='任务表（指令 → task_index）路径，默认 output_root 下的 meta/task_registry.json；'
+                             '放在输出目录之外可在删除重建时仍沿用原来的 task_index')
+    parser.add_argument('--episode_stats', action='store_true',
+                        help='转换时直接用内存中的数组计算每个 episode 的特征统计，写入 meta/episodes_stats.jsonl；'
+                             'video.front 之后用 2StatsJson-get_stats.py --video_only 补上')
     return parser.parse_args()
 
 
-args = parse_args()
-parent_folder_path = args.parent_folder_path
-output_root = args.output_root
-
-# ------------------- 主流程 -------------------
-output_root = os.path.join(output_root, "data")
-os.makedirs(output_root, exist_ok=True)
-print(f"输出目录: {output_root}")
-
-task_type_folders = sorted(
-    [f for f in os.listdir(parent_folder_path) if os.path.isdir(os.path.join(parent_folder_path, f))],
-    key=lambda x: int(x)
-)
-
-global_episode_index = 0
-global_frame_index = 0
-task_index = 0
-
-for type_idx, type_folder in enumerate(task_type_folders):
-    type_path = os.path.join(parent_folder_path, type_folder)
-    chunk_folder = os.path.join(output_root, f"chunk-{type_idx:03d}")
-    os.makedirs(chunk_folder, exist_ok=True)
-
-    task_folders = sorted(
-        [f for f in os.listdir(type_path)
-         if os.path.isdir(os.path.join(type_path, f))],
+def sorted_int_dirs(path):
+    return sorted(
+        [f for f in os.listdir(path) if os.path.isdir(os.path.join(path, f))],
         key=lambda x: int(x)
     )
 
-    for task_folder in task_folders:
-        task_path = os.path.join(type_path, task_folder)
-        # print("task_path:", task_path)
 
-        subtask_folders = sorted([
-            f for f in os.listdir(task_path)
-            if os.path.isdir(os.path.join(task_path, f))
-        ])
-        # print("subtask_folders:", subtask_folders)
-        all_data = []
+def count_csv_rows(csv_file):
+    """只数数据行数（不含标题行、跳过空行），不做解析。"""
+    with open(csv_file, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return sum(1 for row in reader if row)
+
+
+def variant_roots(output_root, sample_intervals):
+    """单个步长时直接写 output_root（与以前一致）；多个步长时每个变体一个子目录。"""
+    if len(sample_intervals) == 1:
+        return {sample_intervals[0]: output_root}
+    return {k: os.path.join(output_root, variant_name(k)) for k in sample_intervals}
+
+
+# ------------------- 阶段一：预扫描，分配全局索引 -------------------
+def scan_episodes(parent_folder_path, data_roots, list_layout="object", manifests=None, chunks_size=1000,
+                  with_stats=False, registry=None):
+    """
+    只统计每个 data.csv 的行数，按与串行相同的遍历顺序预先分配 episode_index，
+    以及每个采样率变体各自的全局 index 起点，返回每个 episode 的转换计划。
+    data_roots: {sample_interval: 该变体的 data 目录}
+    传入 manifests（{sample_interval: manifest episodes}）时，输入未变化的 episode 直接沿用记录的行数，不再数行。
+    with_stats 时转换结果附带每个 episode 的特征统计。
+    task_index 由任务表 registry 按任务类型目录下的 instruction.txt 查得（新指令会登记进去）。
+    """
+    plans = []
+    global_episode_index = 0
+    global_frame_index = {k: 0 for k in data_roots}
+    if registry is None:
+        registry = TaskRegistry()
+
+    for type_folder in sorted_int_dirs(parent_folder_path):
+        type_path = os.path.join(parent_folder_path, type_folder)
+
+        instr_file = os.path.join(type_path, "instruction.txt")
+        if not os.path.exists(instr_file):
+            raise FileNotFoundError(f"未找到指令: {instr_file}")
+        with open(instr_file, "r", encoding="utf-8") as f:
+            task_index = registry.task_index(f.read().strip())
 
         # 奇偶决定 grasp
         try:
@@ -82,134 +105,368 @@ for type_idx, type_folder in enumerate(task_type_folders):
             folder_num = 0
         grasp_flag = (folder_num % 2 == 0)
 
-        for folder in subtask_folders:
-            grasp = grasp_flag
-            csv_file = os.path.join(task_path, folder, "data.csv")
+        for task_folder in sorted_int_dirs(type_path):
+            task_path = os.path.join(type_path, task_folder)
+
+            subtask_folders = sorted([
+                f for f in os.listdir(task_path)
+                if os.path.isdir(os.path.join(task_path, f))
+            ])
 
-            if not os.path.exists(csv_file):
-                print(f"⚠️ 文件不存在: {csv_file}, 已跳过")
+            csv_files = []
+            for folder in subtask_folders:
+                csv_file = os.path.join(task_path, folder, "data.csv")
+                if not os.path.exists(csv_file):
+                    print(f"⚠️ 文件不存在: {csv_file}, 已跳过")
+                    continue
+                csv_files.append(csv_file)
+
+            if not csv_files:
+                print("⚠️ 无有效数据，跳过任务。")
                 continue
 
-            df = pd.read_csv(csv_file)
-
-            required_columns = ["位置X", "位置Y", "位置Z",
-                                "姿态X", "姿态Y", "姿态Z", "姿态W","bbox_x1","bbox_y1","bbox_x2","bbox_y2"]
-            if not all(col in df.columns for col in required_columns):
-                raise ValueError(f"CSV 缺少必要列: {csv_file}")
-
-            df = df[required_columns]
-
-            df["bbox_x1"] = df["bbox_x1"] / 1000.0 * 640.0
-            df["bbox_x2"] = df["bbox_x2"] / 1000.0 * 640.0
-            df["bbox_y1"] = df["bbox_y1"] / 1000.0 * 480.0
-            df["bbox_y2"] = df["bbox_y2"] / 1000.0 * 480.0
-
-            df["grasp"] = grasp
-
-            # 保留位置和姿态列 + bbox + grasp
-            all_data.append(df)
-            # print("all_data:",all_data)
-
-        if not all_data:
-            print("⚠️ 无有效数据，跳过任务。")
-            continue
-
-        merged_df = pd.concat(all_data, ignore_index=True)
-
-        # 下采样
-        sample_interval = 2
-        if len(merged_df) > 0:
-            # 先记住原始的“真正最后一帧”
-            last_row = merged_df.iloc[-1].copy()
-
-            # 正常按步长下采样
-            sampled_df = merged_df.iloc[::sample_interval].copy()
-
-            # 如果真正最后一帧的索引不是采样点，
-            # 就把“采样后的最后一帧”整行替换成真正最后一帧
-            if (len(merged_df) - 1) % sample_interval != 0:
-                sampled_df.iloc[-1] = last_row
-
-            merged_df = sampled_df.reset_index(drop=True)
-
-        # ---------- 先转换四元数为欧拉角，再归一化，再合并 ----------
-        p0 = np.array([
-            merged_df["位置X"].iloc[0],
-            merged_df["位置Y"].iloc[0],
-            merged_df["位置Z"].iloc[0]
-        ], dtype=float)
-
-        q0 = np.array([
-            merged_df["姿态X"].iloc[0],
-            merged_df["姿态Y"].iloc[0],
-            merged_df["姿态Z"].iloc[0],
-            merged_df["姿态W"].iloc[0]
-        ], dtype=float)
-        q0 = quat_normalize(q0)
-        R0 = R.from_quat(q0)
-        euler0 = R0.as_euler('xyz', degrees=False)
-
-        norm_states = []
-
-        for i in range(len(merged_df)):
-            # 平移部分
-            pos = np.array([
-                merged_df["位置X"].iloc[i],
-                merged_df["位置Y"].iloc[i],
-                merged_df["位置Z"].iloc[i]
-            ], dtype=float)
-            rel_pos = pos - p0
-
-            # 四元数→欧拉角
-            q = np.array([
-                merged_df["姿态X"].iloc[i],
-                merged_df["姿态Y"].iloc[i],
-                merged_df["姿态Z"].iloc[i],
-                merged_df["姿态W"].iloc[i]
-            ], dtype=float)
-            q = quat_normalize(q)
-            R_t = R.from_quat(q)
-            euler = R_t.as_euler('xyz', degrees=False)
-
-            # 欧拉角归一化
-            rel_euler = euler - euler0
-            rel_euler = (rel_euler + np.pi) % (2 * np.pi) - np.pi
-
-            # 拼接位置+欧拉角
-            state = np.concatenate([rel_pos, rel_euler]).tolist()
-            norm_states.append(state)
-
-        merged_df["state"] = norm_states
-        merged_df["bbox"] = merged_df[["bbox_x1", "bbox_y1", "bbox_x2", "bbox_y2"]].values.tolist()
-
-        # ---------- 生成 action.next_position ----------
-        actions = []
-        for i in range(len(merged_df)):
-            if i < len(merged_df) - 1:
-                actions.append(merged_df["state"].iloc[i + 1])
+            key = f"{type_folder}/{task_folder}"
+            dirty, inputs = True, None
+            if manifests is not None:
+                rel_paths = [os.path.relpath(f, parent_folder_path) for f in csv_files]
+                dirty = False
+                for manifest in manifests.values():
+                    old = manifest.get(key)
+                    unchanged, inputs = check_inputs(old and old["inputs"], csv_files, rel_paths)
+                    dirty = dirty or not unchanged
+
+            if dirty:
+                num_rows = sum(count_csv_rows(f) for f in csv_files)
             else:
-                actions.append(merged_df["state"].iloc[i])
-        merged_df["action"] = actions
-
-        # ---------- 索引与保存 ----------
-        episode_index = global_episode_index
-        global_episode_index += 1
-
-        merged_df["frame_index"] = range(len(merged_df))
-        merged_df["index"] = range(global_frame_index, global_frame_index + len(merged_df))
-        global_frame_index += len(merged_df)
-        merged_df["episode_index"] = episode_index
-        merged_df["timestamp"] = np.arange(len(merged_df)) * 0.2 * sample_interval
-        merged_df["task_index"] = task_index
-
-        merged_df = merged_df[[
-            "index", "episode_index", "frame_index", "timestamp",
-            "task_index", "state", "action", "bbox", "grasp"
-        ]]
-
-        parquet_file = os.path.join(chunk_folder, f"episode_{episode_index:06d}.parquet")
+                num_rows = next(iter(manifests.values()))[key]["num_rows"]
+
+            chunk_name = f"chunk-{global_episode_index // chunks_size:03d}"
+            variants = []
+            for k, data_root in data_roots.items():
+                chunk_folder = os.path.join(data_root, chunk_name)
+                os.makedirs(chunk_folder, exist_ok=True)
+                length = sampled_length(num_rows, k)
+                variants.append({
+                    "sample_interval": k,
+                    "frame_offset": global_frame_index[k],
+                    "length": length,
+                    "parquet_file": os.path.join(chunk_folder, f"episode_{global_episode_index:06d}.parquet"),
+                })
+                global_frame_index[k] += length
+
+            plans.append({
+                "key": key,
+                "dirty": dirty,
+                "inputs": inputs,
+                "episode_index": global_episode_index,
+                "num_rows": num_rows,
+                "task_index": task_index,
+                "task_folder": task_folder,
+                "grasp": grasp_flag,
+                "csv_files": csv_files,
+                "list_layout": list_layout,
+                "with_stats": with_stats,
+                "variants": variants,
+            })
+            global_episode_index += 1
+
+    return plans
+
+
+# ------------------- 阶段二：逐 episode 转换 -------------------
+def load_episode_arrays(csv_files):
+    """读取并拼接一个长程任务下所有子任务的 data.csv，只解析位姿和 bbox 列。"""
+    parts = [load_raw_episode(csv_file) for csv_file in csv_files]
+    pos = np.concatenate([p["pos"] for p in parts])
+    quat = np.concatenate([p["quat"] for p in parts])
+    bbox = np.concatenate([p["bbox"] for p in parts])
+
+    # bbox 从 0~1000 归一化坐标换算到 640x480 像素
+    bbox[:, [0, 2]] = bbox[:, [0, 2]] / 1000.0 * 640.0
+    bbox[:, [1, 3]] = bbox[:, [1, 3]] / 1000.0 * 480.0
+    return pos, quat, bbox
+
+
+def convert_episode(plan):
+    """
+    按计划转换一个 episode：CSV 只读一次、state 只算一次（全帧率，相对首帧），
+    再按每个变体的步长取帧写出 parquet。只依赖 plan，可在任意进程执行。
+    """
+    pos, quat, bbox = load_episode_arrays(plan["csv_files"])
+
+    if len(pos) != plan["num_rows"]:
+        raise RuntimeError(
+            f"预扫描行数与实际不符: {plan['task_folder']} 预期 {plan['num_rows']}，实际 {len(pos)}"
+        )
+
+    # ---------- 四元数→欧拉角，相对首帧归一化（整段向量化） ----------
+    # 第 0 帧总会被采样，所以先算全帧率 state 再取帧，与先下采样再算结果一致
+    full_states = relative_states(pos, quat)
+
+    results = []
+    for variant in plan["variants"]:
+        # 下采样：按步长取帧，真正的最后一帧替换采样后的最后一帧
+        idx = sample_indices(len(pos), variant["sample_interval"])
+        results.append(write_episode(plan, variant, full_states[idx], bbox[idx]))
+    return results
+
+
+def episode_columns(plan, variant, states, actions, bbox):
+    """一个变体 episode 的全部列（numpy 数组），两种存储方式和特征统计共用。"""
+    n = len(states)
+    frame_offset = variant["frame_offset"]
+    return {
+        "index": np.arange(frame_offset, frame_offset + n, dtype=np.int64),
+        "episode_index": np.full(n, plan["episode_index"], dtype=np.int64),
+        "frame_index": np.arange(n, dtype=np.int64),
+        "timestamp": np.arange(n) * (1.0 / SOURCE_FPS) * variant["sample_interval"],
+        "task_index": np.full(n, plan["task_index"], dtype=np.int64),
+        "state": states,
+        "action": actions,
+        "bbox": bbox,
+        "grasp": np.full(n, plan["grasp"], dtype=bool),
+    }
+
+
+def write_episode(plan, variant, states, bbox):
+    """
+    写出一个变体的 parquet，返回 (parquet_file, 帧数, 特征统计)；
+    plan["with_stats"] 为假时特征统计为 None。
+    """
+    # ---------- 生成 action.next_position（数组平移） ----------
+    actions = next_state_actions(states)
+    columns = episode_columns(plan, variant, states, actions, bbox)
+
+    parquet_file = variant["parquet_file"]
+    if plan["list_layout"] == "fixed":
+        # 直接从 numpy buffer 构造 Arrow 表写出，向量列为 FixedSizeList<float32>
+        pq.write_table(build_fixed_table(columns), parquet_file)
+    else:
+        merged_df = pd.DataFrame({
+            name: (arr.tolist() if arr.ndim == 2 else arr) for name, arr in columns.items()
+        })
         merged_df.to_parquet(parquet_file, engine="pyarrow", index=False)
 
-        print(f"✅ 已生成长程任务 {task_folder} 的 parquet 文件: {parquet_file}, 帧数={len(merged_df)}")
-        # assert False
-    task_index += 1
+    # 统计直接用内存中的数组，与之后读回 parquet 再算的结果一致（均先转 float32）
+    stats = feature_stats(columns)[0] if plan["with_stats"] else None
+    return parquet_file, len(states), stats
+
+
+# ------------------- 增量转换 -------------------
+def split_incremental(plans, manifests, data_roots):
+    """
+    对每个采样率变体，把 episode 分成：需要重新转换的（输入变了或输出缺失），
+    以及输入未变、但 episode_index / index 起点 / task_index 因前面的 episode 变化而平移、需要修补的。
+    返回 (只保留待转换变体的计划列表, [(plan, variant, 旧文件)])。
+    """
+    to_convert, to_patch = [], []
+    for plan in plans:
+        convert_variants = []
+        for variant in plan["variants"]:
+            k = variant["sample_interval"]
+            old = manifests[k].get(plan["key"])
+            old_file = os.path.join(data_roots[k], old["parquet_file"]) if old else None
+            if plan["dirty"] or old_file is None or not os.path.exists(old_file):
+                convert_variants.append(variant)
+            elif (old["episode_index"], old["frame_offset"], old["task_index"], old_file) != \
+                    (plan["episode_index"], variant["frame_offset"], plan["task_index"], variant["parquet_file"]):
+                to_patch.append((plan, variant, old_file))
+        if convert_variants:
+            to_convert.append(dict(plan, variants=convert_variants))
+    return to_convert, to_patch
+
+
+def stage_patch(plan, variant, old_file):
+    """只改写平移后的索引列，先写到临时文件，避免覆盖还没读取的旧文件。"""
+    n = variant["length"]
+    tmp_file = variant["parquet_file"] + ".tmp"
+    patch_columns(old_file, tmp_file, {
+        "index": np.arange(variant["frame_offset"], variant["frame_offset"] + n, dtype=np.int64),
+        "episode_index": np.full(n, plan["episode_index"], dtype=np.int64),
+        "task_index": np.full(n, plan["task_index"], dtype=np.int64),
+    })
+    return tmp_file
+
+
+def manifest_entry(plan, variant, data_root):
+    return {
+        "episode_index": plan["episode_index"],
+        "frame_offset": variant["frame_offset"],
+        "length": variant["length"],
+        "num_rows": plan["num_rows"],
+        "task_index": plan["task_index"],
+        "parquet_file": os.path.relpath(variant["parquet_file"], data_root),
+        "inputs": plan["inputs"],
+    }
+
+
+def report(plan, results):
+    for parquet_file, n, _ in results:
+        print(f"✅ 已生成长程任务 {plan['task_folder']} 的 parquet 文件: {parquet_file}, 帧数={n}")
+
+
+def run_conversions(plans, workers, on_stats=None):
+    """on_stats(sample_interval, episode_index, stats)：每个 episode 完成后按 episode 顺序回调。"""
+    def finish(plan, results):
+        report(plan, results)
+        if on_stats is not None:
+            for variant, (_, _, stats) in zip(plan["variants"], results):
+                on_stats(variant["sample_interval"], plan["episode_index"], stats)
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for plan, results in zip(plans, pool.map(convert_episode, plans)):
+                finish(plan, results)
+    else:
+        for plan in plans:
+            finish(plan, convert_episode(plan))
+
+
+def stats_line(episode_index, stats):
+    return json.dumps({"episode_index": episode_index, "stats": stats}) + "\n"
+
+
+def load_episode_stats(path):
+    """读取已有的 episodes_stats.jsonl，返回 {episode_index: stats}；文件不存在时为空。"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        episodes = [json.loads(line) for line in f if line.strip()]
+    return {ep["episode_index"]: ep["stats"] for ep in episodes}
+
+
+def run_incremental(plans, manifests, data_roots, manifest_paths, settings, workers, stats_paths=None):
+    to_convert, to_patch = split_incremental(plans, manifests, data_roots)
+    print(f"增量模式: 重新转换 {len(to_convert)} 个 episode, 修补索引 {len(to_patch)} 个文件")
+
+    staged = [(stage_patch(plan, variant, old_file), variant["parquet_file"])
+              for plan, variant, old_file in to_patch]
+
+    # 增量时 episode 不是按顺序完成的，统计先收集起来，最后按 episode_index 排序写出
+    episode_stats = {k: {} for k in data_roots}
+    on_stats = (lambda k, i, stats: episode_stats[k].__setitem__(i, stats)) if stats_paths else None
+    run_conversions(to_convert, workers, on_stats)
+
+    # ---------- 最终修补：换入平移了索引的文件，并删除不再对应任何 episode 的旧文件 ----------
+    for tmp_file, parquet_file in staged:
+        os.replace(tmp_file, parquet_file)
+        print(f"🔧 已修补索引: {parquet_file}")
+
+    if stats_paths:
+        # 没有重新转换的 episode：输入和索引都没变的沿用上次的统计，
+        # 只修补了索引的（或上次没有统计的）读回 parquet 重新计算
+        patched = {(plan["key"], variant["sample_interval"]) for plan, variant, _ in to_patch}
+        for k, path in stats_paths.items():
+            previous = load_episode_stats(path)
+            for plan in plans:
+                variant = next(v for v in plan["variants"] if v["sample_interval"] == k)
+                i = plan["episode_index"]
+                if i in episode_stats[k]:
+                    continue
+                if (plan["key"], k) not in patched and i in previous:
+                    episode_stats[k][i] = previous[i]
+                else:
+                    episode_stats[k][i] = feature_stats(read_columns(variant["parquet_file"]))[0]
+            with open(path, "w") as f:
+                for episode_index in sorted(episode_stats[k]):
+                    f.write(stats_line(episode_index, episode_stats[k][episode_index]))
+
+    for k, data_root in data_roots.items():
+        targets = {os.path.normpath(v["parquet_file"])
+                   for p in plans for v in p["variants"] if v["sample_interval"] == k}
+        for old in manifests[k].values():
+            old_file = os.path.normpath(os.path.join(data_root, old["parquet_file"]))
+            if old_file not in targets and os.path.exists(old_file):
+                os.remove(old_file)
+                print(f"🗑️ 已删除过期文件: {old_file}")
+
+        entries = {}
+        for plan in plans:
+            for variant in plan["variants"]:
+                if variant["sample_interval"] == k:
+                    entries[plan["key"]] = manifest_entry(plan, variant, data_root)
+        save_manifest(manifest_paths[k], settings[k], entries)
+
+
+
+def write_conversion_info(dataset_root, sample_interval, chunks_size):
+    """记录该数据集实际的采样步长、fps 与 chunks_size，供 6get_info.py 等后续脚本使用。"""
+    meta_dir = os.path.join(dataset_root, "meta")
+    os.makedirs(meta_dir, exist_ok=True)
+    with open(os.path.join(meta_dir, "conversion.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "source_fps": SOURCE_FPS,
+            "sample_interval": sample_interval,
+            "fps": variant_fps(sample_interval),
+            "chunks_size": chunks_size,
+        }, f, ensure_ascii=False, indent=4)
+
+
+# ------------------- 主流程 -------------------
+def main():
+    args = parse_args()
+    sample_intervals = list(dict.fromkeys(args.sample_intervals))
+    roots = variant_roots(args.output_root, sample_intervals)
+
+    data_roots = {}
+    for k, root in roots.items():
+        data_roots[k] = os.path.join(root, "data")
+        os.makedirs(data_roots[k], exist_ok=True)
+        write_conversion_info(root, k, args.chunks_size)
+        print(f"输出目录: {data_roots[k]} (下采样 {k} 倍, fps={variant_fps(k):g})")
+
+    manifest_paths = {k: os.path.join(root, "meta", "conversion_manifest.json") for k, root in roots.items()}
+    settings = {k: {"sample_interval": k, "list_layout": args.list_layout} for k in roots}
+    if args.incremental:
+        manifests = {k: load_manifest(manifest_paths[k], settings[k]) for k in roots}
+    else:
+        manifests = None
+        # 全量重建后旧 manifest 不再可信
+        for path in manifest_paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+    # 任务表：已登记的指令沿用原 task_index；每个变体的 meta/ 下各存一份
+    registry_paths = [os.path.join(root, "meta", TASK_REGISTRY_FILE) for root in roots.values()]
+    if args.task_registry:
+        registry_paths.insert(0, args.task_registry)
+    registry = TaskRegistry.load(next((p for p in registry_paths if os.path.exists(p)), registry_paths[0]))
+    known_tasks = len(registry)
+
+    plans = scan_episodes(args.parent_folder_path, data_roots, args.list_layout, manifests, args.chunks_size,
+                          args.episode_stats, registry)
+    for path in registry_paths:
+        registry.save(path)
+    print(f"任务表: {len(registry)} 个任务（新增 {len(registry) - known_tasks} 个）")
+    print(f"预扫描完成: {len(plans)} 个 episode, {sum(p['num_rows'] for p in plans)} 帧（下采样前）")
+
+    stats_paths = None
+    if args.episode_stats:
+        stats_paths = {k: os.path.join(root, "meta", "episodes_stats.jsonl") for k, root in roots.items()}
+
+    if manifests is None:
+        stats_files = {}
+        try:
+            if stats_paths:
+                stats_files = {k: open(path, "w") for k, path in stats_paths.items()}
+            # episode 完成一个就追加一行（pool.map 按提交顺序返回，行按 episode_index 有序）
+            on_stats = (lambda k, i, stats: stats_files[k].write(stats_line(i, stats))) if stats_files else None
+            run_conversions(plans, args.workers, on_stats)
+        finally:
+            for f in stats_files.values():
+                f.close()
+    else:
+        run_incremental(plans, manifests, data_roots, manifest_paths, settings, args.workers, stats_paths)
+
+    if args.consolidated:
+        for k, data_root in data_roots.items():
+            episode_files = [(p["episode_index"], v["parquet_file"])
+                             for p in plans for v in p["variants"] if v["sample_interval"] == k]
+            sidecar = consolidate_episodes(episode_files, os.path.join(data_root, CONSOLIDATED_DIR),
+                                           args.consolidated_rows)
+            print(f"📦 已写出合并布局: {os.path.join(data_root, CONSOLIDATED_DIR)}, "
+                  f"{len(sidecar['files'])} 个文件, {len(sidecar['episodes'])} 个 episode")
+
+
+if __name__ == "__main__":
+    main()
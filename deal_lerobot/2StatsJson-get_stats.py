@@ -1,11 +1,13 @@
 import os
 import glob
 import json
-import pandas as pd
 import numpy as np
-import cv2
 from tqdm import tqdm
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from parquet_io import read_columns
+from stats_utils import RunningStats, feature_stats, sample_video_channel_stats, video_channel_stats
 
 def convert_to_native(obj):
     if isinstance(obj, np.ndarray):
@@ -23,110 +25,169 @@ def convert_to_native(obj):
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Process some paths.')
-    parser.add_argument('--root', 
-                       type=str, 
+    parser.add_argument('--root',
+                       type=str,
                        required=True,
                        help='Root directory path')
+    parser.add_argument('--workers',
+                       type=int,
+                       default=1,
+                       help='Number of worker processes (1 = serial)')
+    parser.add_argument('--video_only',
+                       action='store_true',
+                       help='Reuse feature stats already in meta/episodes_stats.jsonl '
+                            '(1Parquet-csv2par.py --episode_stats) and only add video.front')
+    # 近似 video 统计：任一项非默认值即启用，video.front 额外输出 sample_count / mean_stderr
+    parser.add_argument('--video_frame_step',
+                       type=int,
+                       default=1,
+                       help='Use every k-th frame for video stats')
+    parser.add_argument('--video_samples',
+                       type=int,
+                       default=0,
+                       help='Use a fixed random sample of N frames per video (0 = off)')
+    parser.add_argument('--video_pixel_step',
+                       type=int,
+                       default=1,
+                       help='Decode at 1/k resolution (decoder lowres + scaling with PyAV, pixel decimation otherwise)')
+    parser.add_argument('--seed',
+                       type=int,
+                       default=0,
+                       help='Random seed for --video_samples')
     return parser.parse_args()
 
-args = parse_args()
-root_path = args.root
-# ---------- 原始数据和视频根目录 ----------
-data_root = f"{root_path}/data"       # parquet 根目录
-video_root = f"{root_path}/videos"    # video.front 根目录
-output_jsonl = f"{root_path}/meta/episodes_stats.jsonl"
-
-# ---------- 获取所有 parquet 文件 ----------
-parquet_files = sorted(glob.glob(os.path.join(data_root, "chunk-*", "*.parquet")))
-
-episode_stats_list = []
-
-for pq_file in tqdm(parquet_files):
-    df = pd.read_parquet(pq_file)
-    episode_index = int(df["episode_index"].iloc[0])
-    stats = {}
-
-    # -------- 对所有列计算统计值 --------
-    for feature in df.columns:
-        arr = df[feature].to_numpy()
-
-        if isinstance(arr[0], (list, np.ndarray)):
-            arr = np.stack(arr).astype(np.float32)
-            min_val = arr.min(axis=0).tolist()
-            max_val = arr.max(axis=0).tolist()
-            mean_val = arr.mean(axis=0).tolist()
-            std_val = arr.std(axis=0).tolist()
-        else:
-            arr = arr.astype(np.float32)
-            min_val = [float(arr.min())]
-            max_val = [float(arr.max())]
-            mean_val = [float(arr.mean())]
-            std_val = [float(arr.std())]
-
-        stats[feature] = {
-            "min": min_val,
-            "max": max_val,
-            "mean": mean_val,
-            "std": std_val,
-            "count": [len(arr)]
-        }
+
+def episode_num_from_file(pq_file):
+    return int(os.path.basename(pq_file).split("_")[-1].split(".")[0])
+
+
+def episode_stats(pq_file, video_root, video_sampling=None, known_stats=None):
+    """
+    计算单个 episode 的统计量。
+    返回 (episode_index, stats, partials)：stats 写入 episodes_stats.jsonl，
+    partials 为每个特征可合并的部分矩（RunningStats），用于数据集级 stats.json。
+    video_sampling 非 None 时 video.front 走近似模式
+    （{"frame_step", "num_samples", "pixel_step", "seed"}，见 sample_video_channel_stats）。
+    known_stats 为转换时已算好的特征统计（episodes_stats.jsonl 中的 stats）时不再读取 parquet，
+    episode_index 取自文件名，只补 video.front。
+    """
+    if known_stats is None:
+        # 向量列直接得到 (N,k) 数组（FixedSizeList 为零拷贝视图），不再逐行 np.stack
+        columns = read_columns(pq_file)
+        episode_index = int(columns["episode_index"][0])
+        # -------- 对所有列计算统计值 --------
+        stats, partials = feature_stats(columns)
+    else:
+        episode_index = episode_num_from_file(pq_file)
+        stats = dict(known_stats)
+        partials = {feature: RunningStats.from_dict(v) for feature, v in known_stats.items()
+                    if feature != "video.front"}
 
     # -------- video.front 统计 --------
     chunk_name = os.path.basename(os.path.dirname(pq_file))
-    episode_file = os.path.basename(pq_file)
-    episode_num = episode_file.split("_")[-1].split(".")[0]
+    episode_num = f"{episode_num_from_file(pq_file):06d}"
     video_path = os.path.join(video_root, chunk_name, "video.front", f"episode_{episode_num}.mp4")
     # video_path = os.path.join(video_root, chunk_name, "front", f"episode_{episode_num}.mp4")
-    print("video_path:",video_path)
     if os.path.exists(video_path):
-        cap = cv2.VideoCapture(video_path)
-        frames = []
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = frame.astype(np.float32) / 255.0
-            frames.append(frame)
-        cap.release()
-
-        frames = np.array(frames)
-        per_channel = frames.mean(axis=(1, 2))  # shape (num_frames, C)
-
-        # 每个通道再套一层 []
-        min_val_fmt = [[v] for v in per_channel.min(axis=0)]
-        max_val_fmt = [[v] for v in per_channel.max(axis=0)]
-        mean_val_fmt = [[v] for v in per_channel.mean(axis=0)]
-        std_val_fmt = [[v] for v in per_channel.std(axis=0)]
-
-        stats["video.front"] = {
-            "min": min_val_fmt,
-            "max": max_val_fmt,
-            "mean": mean_val_fmt,
-            "std": std_val_fmt,
-            "count": [frames.shape[0]]
+        # 流式统计：每帧只保留 RGB 三通道均值，running min/max/mean/std（Welford），不缓存整段视频
+        if video_sampling is None:
+            per_channel = video_channel_stats(video_path)
+            # 每个通道再套一层 []
+            stats["video.front"] = per_channel.to_dict(nested=True)
+        else:
+            # 近似模式：只统计抽中的帧；count 仍为总帧数，另记抽样帧数和 mean 的标准误差
+            sampling = dict(video_sampling, seed=(video_sampling["seed"], episode_index))
+            per_channel, num_frames = sample_video_channel_stats(video_path, **sampling)
+            stats["video.front"] = per_channel.to_dict(nested=True)
+            stats["video.front"]["count"] = [num_frames]
+            stats["video.front"]["sample_count"] = [per_channel.count]
+            stats["video.front"]["mean_stderr"] = [[float(v)] for v in per_channel.mean_stderr(num_frames)]
+        partials["video.front"] = per_channel
+
+    # timestamp 的统计直接取自 parquet 的 timestamp 列，与 stats.json 一致，不再按视频帧数和固定 5fps 推算
+    return episode_index, stats, partials
+
+
+def _episode_stats_task(task):
+    return episode_stats(*task)
+
+
+def dataset_stats(all_partials, approximate_video=False):
+    """
+    用并行方差公式把所有 episode 的部分矩合并成数据集级 stats。
+    approximate_video 时 video.front 的 count 为抽样帧数，并附上 mean 的标准误差。
+    """
+    merged = {}
+    for partials in all_partials:
+        for feature, part in partials.items():
+            if feature not in merged:
+                merged[feature] = RunningStats(len(part.mean))
+            merged[feature].merge(part)
+    stats = {feature: part.to_dict(nested=(feature == "video.front")) for feature, part in merged.items()}
+    if approximate_video and "video.front" in merged:
+        video = merged["video.front"]
+        stats["video.front"]["sample_count"] = [int(video.count)]
+        stats["video.front"]["mean_stderr"] = [[float(v)] for v in video.mean_stderr()]
+    return stats
+
+
+def main():
+    args = parse_args()
+    root_path = args.root
+    # ---------- 原始数据和视频根目录 ----------
+    data_root = f"{root_path}/data"       # parquet 根目录
+    video_root = f"{root_path}/videos"    # video.front 根目录
+    output_jsonl = f"{root_path}/meta/episodes_stats.jsonl"
+    output_stats = f"{root_path}/meta/stats.json"
+
+    # ---------- 获取所有 parquet 文件 ----------
+    parquet_files = sorted(glob.glob(os.path.join(data_root, "chunk-*", "*.parquet")))
+    approximate_video = (args.video_frame_step > 1 or args.video_samples > 0 or args.video_pixel_step > 1)
+    video_sampling = None
+    if approximate_video:
+        video_sampling = {
+            "frame_step": max(args.video_frame_step, 1),
+            "num_samples": args.video_samples,
+            "pixel_step": max(args.video_pixel_step, 1),
+            "seed": args.seed,
         }
+    known = {}
+    if args.video_only:
+        # 特征统计已由转换脚本写好，这里只读 jsonl，不再读取 parquet
+        with open(output_jsonl, "r") as f:
+            for line in f:
+                if line.strip():
+                    ep = json.loads(line)
+                    known[ep["episode_index"]] = ep["stats"]
+        missing = [f for f in parquet_files if episode_num_from_file(f) not in known]
+        if missing:
+            raise RuntimeError(f"{output_jsonl} 中缺少 {len(missing)} 个 episode 的统计，例如 {missing[0]}")
+    tasks = [(pq_file, video_root, video_sampling, known.get(episode_num_from_file(pq_file)))
+             for pq_file in parquet_files]
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(tqdm(pool.map(_episode_stats_task, tasks, chunksize=4), total=len(tasks)))
+    else:
+        results = [_episode_stats_task(task) for task in tqdm(tasks)]
 
-        stats["timestamp"] = {
-            "min": [0.0],
-            "max": [float((frames.shape[0]-1)/5.0)],
-            "mean": [float(((frames.shape[0]-1)/2)/5.0)],
-            "std": [float(np.std(np.linspace(0, (frames.shape[0]-1)/5.0, frames.shape[0])))],
-            "count": [frames.shape[0]]
-        }
+    # 按 episode_index 排序
+    results.sort(key=lambda x: x[0])
+
+    # 写文件
+    with open(output_jsonl, "w") as f:
+        for episode_index, stats, _ in results:
+            ep_native = convert_to_native({"episode_index": episode_index, "stats": stats})
+            f.write(json.dumps(ep_native) + "\n")
+
+    print(f"Saved {len(results)} episodes to {output_jsonl}")
 
-    episode_stats_list.append({
-        "episode_index": episode_index,
-        "stats": stats
-    })
+    # 数据集级 stats.json：直接由各 episode 的部分矩合并，不再二次读取数据
+    with open(output_stats, "w") as f:
+        json.dump(dataset_stats((partials for _, _, partials in results), approximate_video), f, indent=4)
 
-# 按 episode_index 排序
-episode_stats_list.sort(key=lambda x: x["episode_index"])
+    print(f"Saved dataset stats to {output_stats}")
 
-# 写文件
-with open(output_jsonl, "w") as f:
-    for ep in episode_stats_list:
-        ep_native = convert_to_native(ep)
-        f.write(json.dumps(ep_native) + "\n")
 
-print(f"Saved {len(episode_stats_list)} episodes to {output_jsonl}")
+if __name__ == "__main__":
+    main()
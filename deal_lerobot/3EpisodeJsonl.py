@@ -82,7 +82,7 @@
 """
 # 生成 episodes.jsonl：
 # - 每个 .parquet 文件对应一个 episode
-# - 从对应的 instruction.txt 中读取任务描述
+# - 从对应的 instruction.txt 中读取任务描述（按 parquet 里的 task_index 找任务类型目录）
 # - length = parquet 文件的行数
 """
 
@@ -90,13 +90,16 @@ import os
 import json
 from pathlib import Path
 import argparse
-import pandas as pd
+
+from parquet_meta import FOOTER_CACHE_FILE, scan_footers
+from task_registry import TASK_REGISTRY_FILE, TaskRegistry
 
 # ---------------- 参数解析 ----------------
 parser = argparse.ArgumentParser(description='根据 .parquet 文件生成 episodes.jsonl')
 parser.add_argument('--output_root', required=True, help='存放 .parquet 文件的根目录 (通常是包含 chunk-* 的 data 目录)')
 parser.add_argument('--reorg_root', required=True, help='包含 instruction.txt 的原始重组数据目录')
 parser.add_argument('--output_file', required=True, help='输出 episodes.jsonl 文件路径')
+parser.add_argument('--workers', type=int, default=8, help='并行读取 parquet footer 的线程数')
 args = parser.parse_args()
 
 OUTPUT_ROOT = Path(args.output_root)
@@ -105,6 +108,12 @@ OUTPUT_FILE = Path(args.output_file)
 
 os.makedirs(OUTPUT_FILE.parent, exist_ok=True)
 
+# 有任务表（1Parquet-csv2par.py 写在 meta/ 下）时直接按 task_index 查指令；
+# 否则 task_index 即 1Parquet-csv2par.py 中按数字排序后的任务类型目录序号
+registry_file = OUTPUT_FILE.parent / TASK_REGISTRY_FILE
+registry = TaskRegistry.load(str(registry_file)) if registry_file.exists() else None
+type_folders = sorted([p for p in REORG_ROOT.iterdir() if p.is_dir()], key=lambda x: int(x.name))
+
 episode_index = 0
 lines = []
 
@@ -113,22 +122,26 @@ chunk_folders = sorted([p for p in OUTPUT_ROOT.iterdir() if p.is_dir() and p.nam
 if not chunk_folders:
     raise FileNotFoundError(f"未找到任何 chunk-* 目录，请检查路径：{OUTPUT_ROOT}")
 
+parquet_files = []
 for chunk_folder in chunk_folders:
-    parquet_files = sorted(chunk_folder.glob("episode_*.parquet"))
-    if not parquet_files:
+    files = sorted(chunk_folder.glob("episode_*.parquet"))
+    if not files:
         print(f"[WARN] {chunk_folder} 中未找到 parquet 文件")
-        continue
-
-    for pq_file in parquet_files:
-        try:
-            # 读取 parquet 文件，统计 step 数
-            df = pd.read_parquet(pq_file)
-            length = len(df)
-
-            # 从文件名或目录推断任务索引（根据你的结构）
-            # 假设 chunk-000 对应 reorg_root 下的 0，chunk-001 对应 1 ...
-            type_idx = int(chunk_folder.name.split('-')[-1])+1
-            q_dir = REORG_ROOT / str(type_idx)
+    parquet_files.extend(files)
+
+# 只读 footer：行数即 step 数，task_index 取列统计的 min（一个 episode 内为常数）；结果按 mtime 缓存在 meta/ 下
+footers = scan_footers([str(f) for f in parquet_files], str(OUTPUT_FILE.parent / FOOTER_CACHE_FILE), args.workers)
+
+for pq_file, footer in zip(parquet_files, footers):
+    try:
+        length = footer["num_rows"]
+
+        # chunk 按 chunks_size 划分，不再对应任务类型，改由 task_index 找指令
+        task_index = int(footer["min"]["task_index"])
+        if registry is not None:
+            instruction = registry.task(task_index)
+        else:
+            q_dir = type_folders[task_index]
             instr_file = q_dir / "instruction.txt"
 
             if instr_file.exists():
@@ -138,18 +151,18 @@ for chunk_folder in chunk_folders:
                 instruction = f"[未找到指令: {instr_file}]"
                 assert False
 
-            episode = {
-                "episode_index": episode_index,
-                "tasks": [instruction],
-                "length": length
-            }
+        episode = {
+            "episode_index": episode_index,
+            "tasks": [instruction],
+            "length": length
+        }
 
-            lines.append(json.dumps(episode, ensure_ascii=False))
-            print(f"✅ {pq_file.name} → episode_index={episode_index}, step={length}")
-            episode_index += 1
+        lines.append(json.dumps(episode, ensure_ascii=False))
+        print(f"✅ {pq_file.name} → episode_index={episode_index}, step={length}")
+        episode_index += 1
 
-        except Exception as e:
-            print(f"❌ 处理失败: {pq_file}, 错误: {e}")
+    except Exception as e:
+        print(f"❌ 处理失败: {pq_file}, 错误: {e}")
 
 # ---------------- 写出 JSONL ----------------
 with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
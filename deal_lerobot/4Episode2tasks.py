@@ -2,6 +2,8 @@ import os
 import json
 import argparse
 
+from task_registry import TASK_REGISTRY_FILE, TaskRegistry
+
 # ========== 命令行参数 ==========
 parser = argparse.ArgumentParser(description='根据episode.jsonl文件生成tasks.jsonl文件')
 parser.add_argument('--episodes_file', required=True, help='输入的episodes.jsonl文件路径')
@@ -11,27 +13,15 @@ args = parser.parse_args()
 episodes_file = args.episodes_file
 tasks_file = args.tasks_file
 
-# ========== 自动计算 chunk_size ==========
-meta_dir = os.path.dirname(episodes_file)
-base_dir = os.path.dirname(meta_dir)
-chunk_dir = os.path.join(base_dir, "data", "chunk-000")
-
-parquet_files = [f for f in os.listdir(chunk_dir) if f.endswith(".parquet")]
-chunk_size = len(parquet_files)
-
-if chunk_size == 0:
-    raise ValueError(f"未在 {chunk_dir} 下找到任何 .parquet 文件！")
-
-print(f"✅ 检测到 chunk_size = {chunk_size} (来自 {chunk_dir})")
+# 有任务表（1Parquet-csv2par.py 写在 meta/ 下）时 task_index 直接查表，与 parquet 中的一致
+registry_file = os.path.join(os.path.dirname(os.path.abspath(tasks_file)), TASK_REGISTRY_FILE)
+registry = TaskRegistry.load(registry_file) if os.path.exists(registry_file) else None
 
 # ========== 生成 tasks.jsonl ==========
-seen_tasks = set()
-task_index = 0
-buffer = 0  # ✅ 用整数计数
-
-with open(episodes_file, "r", encoding="utf-8") as f_in, \
-     open(tasks_file, "w", encoding="utf-8") as f_out:
+# 没有任务表时按 episode 顺序，任务第一次出现时分配 task_index（与 1Parquet-csv2par.py 按任务类型递增一致）
+seen_tasks = {}
 
+with open(episodes_file, "r", encoding="utf-8") as f_in:
     for line in f_in:
         line = line.strip()
         if not line:
@@ -39,17 +29,21 @@ with open(episodes_file, "r", encoding="utf-8") as f_in, \
 
         data = json.loads(line)
         tasks = data.get("tasks", [])
-        # print("tasks:", tasks)
-        buffer += 1  # ✅ 每处理一个任务就加1
 
         for task in tasks:
-            if buffer >= chunk_size:
-                seen_tasks.add(task)
-                record = {"task_index": task_index, "task": task}
-                task_index += 1
-
-                # 每到 chunk_size 次就写一次当前任务
-                f_out.write(json.dumps(record, ensure_ascii=False) + "\n")
-                buffer = 0  # ✅ 计数清零
-
-print(f"✅ 已生成 {tasks_file}")
+            if task in seen_tasks:
+                continue
+            if registry is not None:
+                task_index = registry.get(task)
+                if task_index is None:
+                    raise KeyError(f"任务表 {registry_file} 中没有该指令: {task}")
+            else:
+                task_index = len(seen_tasks)
+            seen_tasks[task] = task_index
+
+with open(tasks_file, "w", encoding="utf-8") as f_out:
+    for task, task_index in sorted(seen_tasks.items(), key=lambda x: x[1]):
+        record = {"task_index": task_index, "task": task}
+        f_out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+print(f"✅ 已生成 {tasks_file}，共 {len(seen_tasks)} 个任务")
@@ -1,95 +1,286 @@
 import os
 import cv2
+import glob
+import hashlib
+import json
 from natsort import natsorted
 import argparse
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from video_encoder import open_writer, resolve_encoding
+from frame_sampling import sample_indices, variant_fps
+from parquet_meta import read_footer
+
 
 # 解析命令行参数
-parser = argparse.ArgumentParser(description='视频生成脚本，处理图像并生成视频')
-parser.add_argument('--root_dir', required=True, help='图像文件的根目录路径')
-parser.add_argument('--output_dir', required=True, help='生成视频的输出目录路径')
-args = parser.parse_args()
-
-# 从命令行参数获取路径
-root_dir = args.root_dir
-output_dir = args.output_dir
-os.makedirs(output_dir, exist_ok=True)
-
-episode_counter = 0  # 全局计数器
-
-# 遍历 a 层级 (chunk)
-for a_folder in natsorted(os.listdir(root_dir)):
-    a_path = os.path.join(root_dir, a_folder)
-    if not os.path.isdir(a_path):
-        continue
-    
-    # chunk-00n 文件夹
-    chunk_name = f"chunk-{int(a_folder)-1:03d}"
-    chunk_output_dir = os.path.join(output_dir, chunk_name)
-    os.makedirs(chunk_output_dir, exist_ok=True)
-    
-    # 遍历 b 层级 (parquet)
-    for b_folder in natsorted(os.listdir(a_path)):
-        b_path = os.path.join(a_path, b_folder)
-        if not os.path.isdir(b_path):
+def parse_args():
+    parser = argparse.ArgumentParser(description='视频生成脚本，处理图像并生成视频')
+    parser.add_argument('--root_dir', required=True, help='图像文件的根目录路径')
+    parser.add_argument('--output_dir', required=True, help='生成视频的输出目录路径')
+    parser.add_argument('--chunks_size', type=int, default=1000,
+                        help='每个 chunk-XXX 目录最多放多少个 episode，需与 1Parquet-csv2par.py 一致')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='并行编码的进程数（1 为串行；视频名在编码前统一分配，结果与串行一致）')
+    parser.add_argument('--backend', choices=['opencv', 'ffmpeg'], default='opencv',
+                        help='编码后端：opencv=cv2.VideoWriter mp4v；ffmpeg=管道送帧给 ffmpeg 子进程')
+    parser.add_argument('--codec', default='libx264',
+                        help='ffmpeg 编码器，如 libx264 / libx265 / libsvtav1，不可用时退回 mpeg4')
+    parser.add_argument('--crf', type=int, default=None, help='ffmpeg 的 CRF（mpeg4 时作为 -q:v）')
+    parser.add_argument('--preset', default=None, help='ffmpeg 编码器 preset，如 x264 的 medium、svtav1 的 8')
+    parser.add_argument('--gop', type=int, default=None, help='GOP 长度（关键帧间隔，帧数）')
+    parser.add_argument('--fps', type=float, default=None,
+                        help='视频帧率，默认为 5 / sample_interval（与 parquet 的 fps 一致）')
+    parser.add_argument('--sample_interval', type=int, default=1,
+                        help='与 1Parquet-csv2par.py 相同的下采样步长：只编码被选中的帧（含最后一帧替换），'
+                             '视频帧数与 parquet 行数一致；1 为编码全部图片')
+    parser.add_argument('--data_root', default=None,
+                        help='可选，LeRobot 数据集的 data 目录：编码前核对每个 episode 的帧数与 parquet 行数一致')
+    parser.add_argument('--read_threads', type=int, default=4,
+                        help='每个编码进程内预读解码图片的线程数（0 为在编码线程里直接读）')
+    parser.add_argument('--prefetch', type=int, default=16,
+                        help='预读队列深度：最多提前解码多少帧，限制内存占用')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略 sidecar，全部重新编码')
+    return parser.parse_args()
+
+
+# ------------------- 跳过未变化的 episode -------------------
+# 每个视频旁边放一个 sidecar（episode_XXXXXX.mp4.json），记录输入图片与编码参数的 hash，
+# 以及编码完成时视频文件的 size / mtime；两者都对得上就不再重新编码。
+def sidecar_path(video_path):
+    return video_path + ".json"
+
+
+def episode_fingerprint(root_dir, images, encoding):
+    """按顺序的图片（相对 root_dir 的路径、size、mtime）加编码参数的 sha1，只 stat 不读图片内容。"""
+    entries = []
+    for img_path in images:
+        st = os.stat(img_path)
+        entries.append([os.path.relpath(img_path, root_dir), st.st_size, st.st_mtime_ns])
+    payload = json.dumps({"images": entries, "encoding": encoding}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def is_up_to_date(plan):
+    video_path = plan["video_path"]
+    if not os.path.exists(video_path) or not os.path.exists(sidecar_path(video_path)):
+        return False
+    try:
+        with open(sidecar_path(video_path), "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False
+    st = os.stat(video_path)
+    return (sidecar.get("fingerprint"), sidecar.get("video_size"), sidecar.get("video_mtime_ns")) == \
+        (plan["fingerprint"], st.st_size, st.st_mtime_ns)
+
+
+def write_sidecar(plan):
+    st = os.stat(plan["video_path"])
+    with open(sidecar_path(plan["video_path"]), "w", encoding="utf-8") as f:
+        json.dump({
+            "fingerprint": plan["fingerprint"],
+            "num_frames": len(plan["images"]),
+            "video_size": st.st_size,
+            "video_mtime_ns": st.st_mtime_ns,
+        }, f, ensure_ascii=False, indent=1)
+
+
+def remove_stale_videos(plans, output_dir):
+    """删除输出目录中不再对应任何 episode 的视频及其 sidecar（例如 episode 数变少后）。"""
+    targets = {os.path.normpath(plan["video_path"]) for plan in plans}
+    for video_path in glob.glob(os.path.join(output_dir, "chunk-*", "video.front", "*.mp4")):
+        if os.path.normpath(video_path) not in targets:
+            os.remove(video_path)
+            if os.path.exists(sidecar_path(video_path)):
+                os.remove(sidecar_path(video_path))
+            print(f"🗑️ 已删除过期视频: {video_path}")
+
+
+# ------------------- 阶段一：扫描图片，预先分配全局视频名 -------------------
+def scan_episodes(root_dir, output_dir, chunks_size=1000, encoding=None, read_threads=4, prefetch=16,
+                  sample_interval=1):
+    """
+    按与串行相同的遍历顺序收集每个长程任务的图片，并分配 episode_XXXXXX.mp4 和 chunk 目录。
+    返回 [{"source": b_path, "images": [...], "video_path": ..., "encoding": ..., "fingerprint": ...}]，
+    encoding 为 video_encoder.resolve_encoding 的结果（默认 opencv mp4v 5fps），
+    read_threads / prefetch 为编码时预读图片的线程数和队列深度（见 read_images）。
+    sample_interval > 1 时按 frame_sampling 的规则（与 parquet 相同）只保留被选中的图片，其余图片不会被读取。
+    """
+    if encoding is None:
+        encoding = resolve_encoding()
+    plans = []
+    episode_counter = 0  # 全局计数器
+
+    # 遍历 a 层级 (任务类型)
+    for a_folder in natsorted(os.listdir(root_dir)):
+        a_path = os.path.join(root_dir, a_folder)
+        if not os.path.isdir(a_path):
             continue
-        
-        # 动态读取 b_path 中的文件夹
-        c_folders = natsorted([
-            folder for folder in os.listdir(b_path)
-            if os.path.isdir(os.path.join(b_path, folder))
-        ])
-
-        all_images = []
-        for c_folder in c_folders:
-            c_path = os.path.join(b_path, c_folder, "images", "front")
-            if not os.path.exists(c_path):
+
+        # 遍历 b 层级 (parquet)
+        for b_folder in natsorted(os.listdir(a_path)):
+            b_path = os.path.join(a_path, b_folder)
+            if not os.path.isdir(b_path):
                 continue
-            
-            # 按自然顺序排序图片
-            images = natsorted([
-                os.path.join(c_path, f)
-                for f in os.listdir(c_path)
-                if f.lower().endswith((".png", ".jpg"))
+
+            # 动态读取 b_path 中的文件夹
+            c_folders = natsorted([
+                folder for folder in os.listdir(b_path)
+                if os.path.isdir(os.path.join(b_path, folder))
             ])
-            all_images.extend(images)
-        
-        if not all_images:
-            print(f"跳过空文件夹: {b_path}")
-            continue
-        
-        # 读取第一张图获取视频大小
-        first_img = cv2.imread(all_images[0])
-        height, width, _ = first_img.shape
-        
-        # 全局递增命名
-        video_name = f"episode_{episode_counter:06d}.mp4"
-        folder_name = os.path.basename("video.front")
-        folder_path = os.path.join(chunk_output_dir, folder_name)
-        if not os.path.exists(folder_path):
-            os.mkdir(folder_path)
-        video_path = os.path.join(chunk_output_dir, folder_name, video_name)
-
-        # # 新增：首帧视频的输出目录与路径（文件名与原视频相同，目录不同）
-        # first_folder_name = "video.front_first"                                   # 新增
-        # first_folder_path = os.path.join(chunk_output_dir, first_folder_name)      # 新增
-        # if not os.path.exists(first_folder_path):                                  # 新增
-        #     os.mkdir(first_folder_path)                                            # 新增
-        # first_video_path = os.path.join(first_folder_path, video_name)             # 新增
-        
-        # 保存视频
-        out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), 5, (width, height))
-        for img_path in all_images:
-            img = cv2.imread(img_path)
+
+            all_images = []
+            for c_folder in c_folders:
+                c_path = os.path.join(b_path, c_folder, "images", "front")
+                if not os.path.exists(c_path):
+                    continue
+
+                # 按自然顺序排序图片
+                images = natsorted([
+                    os.path.join(c_path, f)
+                    for f in os.listdir(c_path)
+                    if f.lower().endswith((".png", ".jpg"))
+                ])
+                all_images.extend(images)
+
+            if not all_images:
+                print(f"跳过空文件夹: {b_path}")
+                continue
+
+            if sample_interval > 1:
+                all_images = [all_images[i] for i in sample_indices(len(all_images), sample_interval)]
+
+            # 全局递增命名，episode i 放在 chunk-(i // chunks_size)
+            video_name = f"episode_{episode_counter:06d}.mp4"
+            chunk_output_dir = os.path.join(output_dir, f"chunk-{episode_counter // chunks_size:03d}")
+            video_path = os.path.join(chunk_output_dir, "video.front", video_name)
+            plans.append({"source": b_path, "images": all_images, "video_path": video_path,
+                          "encoding": encoding, "read_threads": read_threads, "prefetch": prefetch,
+                          "fingerprint": episode_fingerprint(root_dir, all_images, encoding)})
+            episode_counter += 1  # 递增
+
+    return plans
+
+
+# ------------------- 阶段二：逐 episode 编码 -------------------
+def _imread(img_path):
+    img = cv2.imread(img_path)
+    if img is None:
+        raise RuntimeError(f"无法读取图片: {img_path}")
+    return img
+
+
+def read_images(image_paths, threads=4, depth=16):
+    """
+    按顺序逐帧产出解码后的图片。threads > 0 时由线程池提前解码后面的帧（cv2.imread 会释放 GIL），
+    与编码重叠；同时在途的帧最多 depth 个，内存占用有上限。
+    """
+    if threads <= 0:
+        for img_path in image_paths:
+            yield _imread(img_path)
+        return
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        paths = iter(image_paths)
+        pending = deque(pool.submit(_imread, img_path) for img_path in islice(paths, max(depth, 1)))
+        while pending:
+            img = pending.popleft().result()
+            # 取走一帧就补提交一帧，保持队列深度
+            img_path = next(paths, None)
+            if img_path is not None:
+                pending.append(pool.submit(_imread, img_path))
+            yield img
+
+
+def encode_episode(plan):
+    """按计划把一个 episode 的图片编码成视频，只依赖 plan，可在任意进程执行。"""
+    all_images = plan["images"]
+    video_path = plan["video_path"]
+    os.makedirs(os.path.dirname(video_path), exist_ok=True)
+    # 先删旧 sidecar：编码中途失败时不会留下“看起来是最新的”视频
+    if os.path.exists(sidecar_path(video_path)):
+        os.remove(sidecar_path(video_path))
+
+    # 第一帧直接用来确定视频大小，不再单独解码一次
+    frames = read_images(all_images, plan.get("read_threads", 4), plan.get("prefetch", 16))
+    first_img = next(frames)
+    height, width, _ = first_img.shape
+
+    # # 新增：首帧视频的输出目录与路径（文件名与原视频相同，目录不同）
+    # first_folder_name = "video.front_first"                                   # 新增
+    # first_folder_path = os.path.join(chunk_output_dir, first_folder_name)      # 新增
+    # if not os.path.exists(first_folder_path):                                  # 新增
+    #     os.mkdir(first_folder_path)                                            # 新增
+    # first_video_path = os.path.join(first_folder_path, video_name)             # 新增
+
+    # 保存视频
+    out = open_writer(video_path, width, height, plan["encoding"])
+    try:
+        out.write(first_img)
+        for img in frames:
             out.write(img)
+    finally:
+        frames.close()
         out.release()
-        
-        # # 新增：保存首帧视频 —— 帧数与原视频一致（len(all_images)），fps 保持 5，因而总时长一致
-        # frame_count = len(all_images)                                              # 新增
-        # first_out = cv2.VideoWriter(first_video_path, cv2.VideoWriter_fourcc(*"mp4v"), 5, (width, height))  # 新增
-        # for _ in range(frame_count):                                               # 新增
-        #     first_out.write(first_img)                                             # 新增
-        # first_out.release()                                                        # 新增
-        
-        print(f"生成视频: {video_path}")
-        # print(f"生成首帧视频: {first_video_path}")                                  # 新增
-        episode_counter += 1  # 递增
+
+    # # 新增：保存首帧视频 —— 帧数与原视频一致（len(all_images)），fps 保持 5，因而总时长一致
+    # frame_count = len(all_images)                                              # 新增
+    # first_out = cv2.VideoWriter(first_video_path, cv2.VideoWriter_fourcc(*"mp4v"), 5, (width, height))  # 新增
+    # for _ in range(frame_count):                                               # 新增
+    #     first_out.write(first_img)                                             # 新增
+    # first_out.release()                                                        # 新增
+    write_sidecar(plan)
+    return video_path
+
+
+def check_frame_counts(plans, output_dir, data_root):
+    """视频帧数必须等于对应 parquet 的行数（只读 parquet footer）。"""
+    mismatched = []
+    for plan in plans:
+        rel = os.path.relpath(plan["video_path"], output_dir)
+        chunk_name, video_name = rel.split(os.sep)[0], os.path.basename(rel)
+        parquet_file = os.path.join(data_root, chunk_name, video_name.replace(".mp4", ".parquet"))
+        if not os.path.exists(parquet_file):
+            mismatched.append(f"{plan['source']}: 缺少 {parquet_file}")
+            continue
+        num_rows = read_footer(parquet_file, columns=())["num_rows"]
+        if num_rows != len(plan["images"]):
+            mismatched.append(f"{plan['source']}: 视频 {len(plan['images'])} 帧, parquet {num_rows} 行")
+    if mismatched:
+        raise RuntimeError("视频帧数与 parquet 行数不一致:\n" + "\n".join(mismatched))
+    print(f"✅ {len(plans)} 个 episode 的视频帧数与 parquet 行数一致")
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    fps = args.fps if args.fps is not None else variant_fps(args.sample_interval)
+    encoding = resolve_encoding(args.backend, args.codec, args.crf, args.preset, args.gop, fps)
+    plans = scan_episodes(args.root_dir, args.output_dir, args.chunks_size, encoding,
+                          args.read_threads, args.prefetch, args.sample_interval)
+    print(f"扫描完成: {len(plans)} 个 episode, 编码器 {encoding['encoder']} ({encoding['codec']}), "
+          f"下采样 {args.sample_interval} 倍, fps={fps:g}")
+    if args.data_root:
+        check_frame_counts(plans, args.output_dir, args.data_root)
+
+    remove_stale_videos(plans, args.output_dir)
+    todo = plans if args.force else [plan for plan in plans if not is_up_to_date(plan)]
+    print(f"需要编码 {len(todo)} 个 episode，跳过未变化的 {len(plans) - len(todo)} 个")
+
+    if args.workers > 1:
+        # 每个进程内 OpenCV 只用单线程，避免 workers × cv2 线程数超额订阅
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=cv2.setNumThreads, initargs=(1,)) as pool:
+            for video_path in pool.map(encode_episode, todo):
+                print(f"生成视频: {video_path}")
+    else:
+        for plan in todo:
+            print(f"生成视频: {encode_episode(plan)}")
+            # print(f"生成首帧视频: {first_video_path}")                              # 新增
+
+
+if __name__ == "__main__":
+    main()
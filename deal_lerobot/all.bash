@@ -4,24 +4,23 @@
 SRC_ROOT="../../datasets/raw/tiny_data" #源数据根目录路径
 DST_ROOT=$SRC_ROOT
 FINAL_ROOT="../../datasets/dzb/our_data_tiny" #最终输出根目录路径
+CHUNKS_SIZE=1000 #每个 chunk 目录最多放多少个 episode，parquet 和视频需一致
+WORKERS=$(nproc) #转换 / 视频编码的并行进程数
+TASK_REGISTRY="${FINAL_ROOT}_task_registry.json" #任务表放在输出目录之外，重建时不会被清掉，已有指令的 task_index 保持不变
 
-rm -r $FINAL_ROOT
+# 保留 videos/：5get_videos.py 会根据每个视频旁的 sidecar 跳过图片和编码参数都没变的 episode
 mkdir -p $FINAL_ROOT
+find $FINAL_ROOT -mindepth 1 -maxdepth 1 ! -name videos -exec rm -r {} +
 
 echo "1"
-python3 1Parquet-csv2par.py --parent_folder_path $DST_ROOT --output_root $FINAL_ROOT
-
-echo "3"
-python3 3EpisodeJsonl.py --output_root $FINAL_ROOT/data --reorg_root $DST_ROOT --output_file $FINAL_ROOT/meta/episodes.jsonl #从.parquet读取index_length
-
-echo "4"
-python3 4Episode2tasks.py --episodes_file $FINAL_ROOT/meta/episodes.jsonl --tasks_file $FINAL_ROOT/meta/tasks.jsonl
+python3 1Parquet-csv2par.py --parent_folder_path $DST_ROOT --output_root $FINAL_ROOT --chunks_size $CHUNKS_SIZE --workers $WORKERS --task_registry $TASK_REGISTRY
 
 echo "5"
-python3 5get_videos.py --root_dir $DST_ROOT --output_dir $FINAL_ROOT/videos
+python3 5get_videos.py --root_dir $DST_ROOT --output_dir $FINAL_ROOT/videos --chunks_size $CHUNKS_SIZE --workers $WORKERS
 
 # echo "2"
 # python3 2StatsJson-get_stats.py --root $FINAL_ROOT   似乎不需要跑这个，后续测试一下
 
-echo "6"
-python3 6get_info.py --output $FINAL_ROOT
\ No newline at end of file
+# 3、4、6 合并：一次扫描生成 episodes.jsonl、tasks.jsonl、info.json（需在视频生成之后）
+echo "3/4/6"
+python3 meta_builder.py --root $FINAL_ROOT --reorg_root $DST_ROOT
\ No newline at end of file
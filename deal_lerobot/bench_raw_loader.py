@@ -0,0 +1,70 @@
+"""
+对比 raw data.csv 的两种读取方式：
+- 旧：pd.read_csv 全列解析 + 类型推断，再取位姿/bbox 列
+- 新：raw_loader.load_raw_episode（pyarrow.csv 投影 + 显式类型 + 多线程）
+
+用法：
+    python bench_raw_loader.py --root ../../datasets/raw/tiny_data --limit 200 --repeat 3
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from raw_loader import POS_COLUMNS, QUAT_COLUMNS, BBOX_COLUMNS, load_raw_episode
+
+
+def load_with_pandas(csv_path):
+    df = pd.read_csv(csv_path)
+    return {
+        "pos": df[POS_COLUMNS].to_numpy(dtype=float),
+        "quat": df[QUAT_COLUMNS].to_numpy(dtype=float),
+        "bbox": df[BBOX_COLUMNS].to_numpy(dtype=float),
+    }
+
+
+def time_loader(name, loader, files, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for f in files:
+            loader(f)
+        best = min(best, time.perf_counter() - start)
+    per_file_ms = best / len(files) * 1000
+    print(f"{name:<28} total={best:.3f}s  per_file={per_file_ms:.3f}ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='raw data.csv 读取方式的 micro-benchmark')
+    parser.add_argument('--root', required=True, help='raw 数据根目录（递归查找 data.csv）')
+    parser.add_argument('--limit', type=int, default=0, help='最多测试多少个 data.csv（0 为全部）')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次')
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.root, "**", "data.csv"), recursive=True))
+    if args.limit > 0:
+        files = files[:args.limit]
+    if not files:
+        raise FileNotFoundError(f"未在 {args.root} 下找到 data.csv")
+
+    # 先确认两种方式结果一致（位姿最多差浮点解析的末位）
+    a, b = load_with_pandas(files[0]), load_raw_episode(files[0])
+    for key in a:
+        if not np.allclose(a[key], b[key], rtol=1e-12, atol=1e-9, equal_nan=True):
+            raise AssertionError(f"两种读取方式结果不一致: {files[0]} [{key}]")
+
+    print(f"共 {len(files)} 个 data.csv，重复 {args.repeat} 次取最快：")
+    t_pd = time_loader("pd.read_csv", load_with_pandas, files, args.repeat)
+    t_mt = time_loader("pyarrow (multi-thread)", load_raw_episode, files, args.repeat)
+    t_st = time_loader("pyarrow (single-thread)",
+                       lambda f: load_raw_episode(f, use_threads=False), files, args.repeat)
+    print(f"加速比: multi-thread x{t_pd / t_mt:.2f}, single-thread x{t_pd / t_st:.2f}")
+
+
+if __name__ == "__main__":
+    main()
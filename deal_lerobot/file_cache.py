@@ -0,0 +1,69 @@
+"""
+按文件 size + mtime 失效的结果缓存（JSON，放在数据集 meta/ 下）。
+
+parquet footer 扫描、视频 probe 等“每个文件算一次、文件不变就不用再算”的元数据共用：
+缓存中的路径相对缓存文件所在目录记录，数据集整体移动后仍然有效。
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def load_file_cache(cache_path, version):
+    """读取缓存；不存在、无法解析或版本不符时返回空 dict。"""
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if cache.get("version") != version:
+        return {}
+    return cache.get("files", {})
+
+
+def save_file_cache(cache_path, version, files):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "files": files}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, cache_path)
+
+
+def cached_map(func, paths, cache_path=None, version=1, params=None, workers=8):
+    """
+    按 paths 的顺序返回 func(path)。
+    cache_path 给出时，size、mtime 和 params 都没变的文件直接用缓存，
+    其余的用线程池并行计算（func 以 I/O 或子进程为主，线程即可），
+    计算后缓存只保留本次的 paths，已删除文件的记录不会残留。
+    """
+    cache_dir = os.path.dirname(cache_path) if cache_path else None
+    cache = load_file_cache(cache_path, version)
+    keys, stamps, results = [], [], [None] * len(paths)
+    todo = []
+    for i, path in enumerate(paths):
+        key = os.path.relpath(path, cache_dir) if cache_dir else path
+        st = os.stat(path)
+        stamp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        keys.append(key)
+        stamps.append(stamp)
+        cached = cache.get(key)
+        if cached is not None and cached["size"] == stamp["size"] and cached["mtime_ns"] == stamp["mtime_ns"] \
+                and cached.get("params") == params:
+            results[i] = cached["value"]
+        else:
+            todo.append(i)
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            for i, value in zip(todo, pool.map(lambda i: func(paths[i]), todo)):
+                results[i] = value
+
+    if cache_path and (todo or len(cache) != len(paths)):
+        save_file_cache(cache_path, version, {
+            key: dict(stamp, params=params, value=value)
+            for key, stamp, value in zip(keys, stamps, results)
+        })
+    return results
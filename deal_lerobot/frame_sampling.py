@@ -0,0 +1,34 @@
+"""
+下采样时的帧选择规则（parquet 与视频共用）。
+
+按步长 k 取第 0, k, 2k, ... 帧；若真正的最后一帧不是采样点，
+就用它替换采样后的最后一帧，保证 episode 的终点不丢失。帧数始终为 ceil(n / k)。
+"""
+
+import numpy as np
+
+
+# 原始数据采集帧率
+SOURCE_FPS = 5.0
+
+
+def sampled_length(n, sample_interval):
+    """下采样后的帧数（最后一帧替换不改变帧数）。"""
+    return (n + sample_interval - 1) // sample_interval
+
+
+def sample_indices(n, sample_interval):
+    """返回被选中的原始帧下标 (ceil(n/k),)。"""
+    idx = np.arange(0, n, sample_interval)
+    if n > 0 and (n - 1) % sample_interval != 0:
+        idx[-1] = n - 1
+    return idx
+
+
+def variant_fps(sample_interval):
+    return SOURCE_FPS / sample_interval
+
+
+def variant_name(sample_interval):
+    """多采样率输出时每个变体的子目录名，如 5hz / 2.5hz / 1.25hz。"""
+    return f"{variant_fps(sample_interval):g}hz"
@@ -0,0 +1,80 @@
+"""
+raw → LeRobot parquet 增量转换用的 manifest。
+
+每个输出 episode 记录其输入 data.csv 的 size / mtime / sha1，以及上次分配的
+episode_index、index 起点、帧数、task_index 和输出文件。下次运行时：
+- size 与 mtime 都没变：直接视为未改动，不读文件
+- size 或 mtime 变了：再比较内容 hash，hash 相同仍视为未改动（只刷新 mtime）
+"""
+
+import hashlib
+import json
+import os
+
+
+MANIFEST_VERSION = 2
+
+
+def file_sha1(path, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_fingerprint(path, rel_path):
+    st = os.stat(path)
+    return {
+        "path": rel_path,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha1": file_sha1(path),
+    }
+
+
+def check_inputs(old_inputs, paths, rel_paths):
+    """
+    比较本次输入与 manifest 中的记录。
+    返回 (unchanged, inputs)，inputs 为本次应写回 manifest 的指纹列表；
+    改动的文件会顺便算好新的 hash。
+    """
+    old_by_path = {item["path"]: item for item in (old_inputs or [])}
+    unchanged = old_inputs is not None and len(old_by_path) == len(paths)
+    inputs = []
+    for path, rel_path in zip(paths, rel_paths):
+        old = old_by_path.get(rel_path)
+        st = os.stat(path)
+        if old is not None and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+            inputs.append(old)
+            continue
+        fp = file_fingerprint(path, rel_path)
+        if old is None or old["sha1"] != fp["sha1"]:
+            unchanged = False
+        inputs.append(fp)
+    return unchanged, inputs
+
+
+def load_manifest(manifest_path, settings):
+    """读取 manifest；不存在、版本不符或转换参数变了都返回空 episodes（即全部重建）。"""
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ manifest 无法读取，将全部重建: {manifest_path} ({e})")
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("settings") != settings:
+        print("⚠️ manifest 版本或转换参数变化，将全部重建")
+        return {}
+    return manifest.get("episodes", {})
+
+
+def save_manifest(manifest_path, settings, episodes):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "settings": settings, "episodes": episodes},
+                  f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, manifest_path)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+一次扫描数据集，同时生成 meta/episodes.jsonl、meta/tasks.jsonl、meta/info.json。
+
+代替依次运行 3EpisodeJsonl.py、4Episode2tasks.py、6get_info.py（三个脚本各自遍历 data/ 和 videos/）：
+- data/：只列一次 chunk-*/episode_*.parquet，行数 / index / episode_index / task_index 都取自 footer（parquet_meta，带缓存）
+- videos/：只列一次，每个视频的帧数 / fps / 分辨率 / 编码取自 video_probe 的缓存结果，不再用 cv2.VideoCapture 打开视频
+- 三个文件由同一份扫描结果生成，episode 数、任务数等互相一致
+- 有 meta/task_registry.json（1Parquet-csv2par.py 写出）时，指令和 task_index 都取自任务表；
+  没有时按旧约定由 --reorg_root 的任务类型目录顺序得到
+
+用法：
+    python meta_builder.py --root $FINAL_ROOT [--reorg_root $SRC_ROOT]
+"""
+
+import argparse
+import glob
+import json
+import os
+
+from parquet_meta import FOOTER_CACHE_FILE, scan_footers
+from video_probe import PROBE_CACHE_FILE, probe_videos
+from task_registry import TASK_REGISTRY_FILE, TaskRegistry
+
+
+def list_episode_files(data_root):
+    return sorted(glob.glob(os.path.join(data_root, "chunk-*", "episode_*.parquet")))
+
+
+def list_videos(video_root):
+    """videos/chunk-*/<video_key>/*.mp4，按路径排序（目录层级固定，不遍历整棵树）。"""
+    return sorted(glob.glob(os.path.join(video_root, "chunk-*", "*", "*.mp4")))
+
+
+def summarize_data(footers):
+    """
+    由所有 parquet 的 footer 得到 total_episodes / total_frames 和向量列维度，不依赖文件顺序：
+    episode_index 必须恰好为 0..E-1，index 必须恰好覆盖 0..F-1（F 为总行数），否则报错。
+    """
+    total_episodes = len(footers)
+    episode_indices = sorted(int(ft["min"]["episode_index"]) for ft in footers)
+    if episode_indices != list(range(total_episodes)):
+        raise RuntimeError(f"❌ episode_index 不连续或有重复: 共 {total_episodes} 个文件，"
+                           f"episode_index 范围 {episode_indices[0]}~{episode_indices[-1]}")
+    total_frames = sum(ft["num_rows"] for ft in footers)
+    ranges = sorted((int(ft["min"]["index"]), int(ft["max"]["index"])) for ft in footers)
+    expected = 0
+    for lo, hi in ranges:
+        if lo != expected:
+            raise RuntimeError(f"❌ index 不连续: 期望从 {expected} 开始，实际为 {lo}")
+        expected = hi + 1
+    if expected != total_frames:
+        raise RuntimeError(f"❌ index 最大值 {expected - 1} 与总行数 {total_frames} 不符")
+
+    vector_dims = {}
+    for ft in footers:
+        for name, size in ft.get("list_sizes", {}).items():
+            if vector_dims.setdefault(name, size) != size:
+                raise RuntimeError(f"❌ {name} 的维度不一致: {vector_dims[name]} vs {size}")
+    return {"total_episodes": total_episodes, "total_frames": total_frames, "vector_dims": vector_dims}
+
+
+def summarize_videos(videos, cache_path=None, workers=8):
+    """
+    probe 所有视频（第一次见到时 probe，之后按 size + mtime 取缓存），返回 (代表性属性, 每个视频的 probe 结果)。
+    分辨率必须一致（info.json 的 shape 只有一个）；fps / 编码不一致时只提示。
+    """
+    if not videos:
+        raise FileNotFoundError("❌ 没有找到任何视频文件！")
+    probes = probe_videos(videos, cache_path, workers)
+    video = probes[0]
+    sizes = {(p["width"], p["height"]) for p in probes}
+    if len(sizes) > 1:
+        raise RuntimeError(f"❌ 视频分辨率不一致: {sorted(sizes)}")
+    for key in ("fps", "codec"):
+        values = {p[key] for p in probes}
+        if len(values) > 1:
+            print(f"⚠️ 视频 {key} 不一致: {sorted(values, key=str)}，info.json 按第一个视频写 {video[key]}")
+    return video, probes
+
+
+def load_conversion(meta_root):
+    """1Parquet-csv2par.py 写的 meta/conversion.json（采样步长、fps、chunks_size），没有时为空 dict。"""
+    conversion_file = os.path.join(meta_root, "conversion.json")
+    if not os.path.exists(conversion_file):
+        return {}
+    with open(conversion_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_instructions(reorg_root):
+    """task_index 即 1Parquet-csv2par.py 中按数字排序后的任务类型目录序号，返回按 task_index 排列的指令。"""
+    type_folders = sorted(
+        [f for f in os.listdir(reorg_root) if os.path.isdir(os.path.join(reorg_root, f))],
+        key=lambda x: int(x)
+    )
+    instructions = []
+    for folder in type_folders:
+        instr_file = os.path.join(reorg_root, folder, "instruction.txt")
+        if not os.path.exists(instr_file):
+            raise FileNotFoundError(f"❌ 未找到指令: {instr_file}")
+        with open(instr_file, "r", encoding="utf-8") as f:
+            instructions.append(f.read().strip())
+    return instructions
+
+
+def build_episodes(footers, instructions):
+    """每个 parquet 一个 episode：length 为行数，任务为其 task_index 对应的指令（instructions[task_index]）。"""
+    episodes = []
+    for episode_index, footer in enumerate(footers):
+        task_index = int(footer["min"]["task_index"])
+        episodes.append({
+            "episode_index": episode_index,
+            "tasks": [instructions[task_index]],
+            "length": footer["num_rows"]
+        })
+    return episodes
+
+
+def build_tasks(episodes):
+    """按 episode 顺序，任务第一次出现时分配 task_index（与 1Parquet-csv2par.py 按任务类型递增一致）。"""
+    tasks = {}
+    for episode in episodes:
+        for task in episode["tasks"]:
+            if task not in tasks:
+                tasks[task] = len(tasks)
+    return [{"task_index": task_index, "task": task} for task, task_index in tasks.items()]
+
+
+def build_info(total_episodes, total_frames, total_tasks, total_videos, total_chunks, chunk_size,
+               data_fps, video, vector_dims=None):
+    """
+    info.json 的内容；video 为 video_probe.probe_video 的结果。
+    vector_dims（{"state": 6, ...}，来自 fixed 布局 parquet 的 schema）给出时覆盖默认的向量维度。
+    """
+    fps, width, height = video["fps"], video["width"], video["height"]
+    channels = 3  # 假设 RGB
+    info = {
+        "codebase_version": "v2.0",
+        "robot_type": "UAV",
+        "total_episodes": total_episodes,
+        "total_frames": total_frames,
+        "total_tasks": total_tasks,
+        "total_videos": total_videos,
+        "total_chunks": total_chunks,
+        "chunks_size": chunk_size,
+        "fps": data_fps,
+        "splits": {
+            "train": f"0:{total_episodes}"
+        },
+        "data_path": "data/chunk-{episode_chunk:03d}/episode_{episode_index:06d}.parquet",
+        "video_path": "videos/chunk-{episode_chunk:03d}/{video_key}/episode_{episode_index:06d}.mp4",
+        "features": {
+            "video.front": {
+                "dtype": "video",
+                "shape": [
+                    height,
+                    width,
+                    channels
+                ],
+                "names": [
+                    "height",
+                    "width",
+                    "channels"
+                ],
+                "info": {
+                    "video.fps": float(fps),
+                    "video.height": height,
+                    "video.width": width,
+                    "video.channels": channels,
+                    "video.codec": video.get("codec") or "mpeg4",       # probe 不到时默认写 mpeg4
+                    "video.pix_fmt": video.get("pix_fmt") or "yuv420p",  # probe 不到时默认写 yuv420p
+                    "video.is_depth_map": False,
+                    "has_audio": False
+                }
+            },
+            "timestamp": {
+                "dtype": "float64",
+                "shape": [1]
+            },
+            "state": {
+                "dtype": "float32",
+                "shape": [6]
+            },
+            "action": {
+                "dtype": "float32",
+                "shape": [6]
+            },
+            "frame_index": {
+                "dtype": "int32",
+                "shape": [1]
+            },
+            "index": {
+                "dtype": "int32",
+                "shape": [1]
+            },
+            "episode_index": {
+                "dtype": "int32",
+                "shape": [1]
+            },
+            "task_index": {
+                "dtype": "int32",
+                "shape": [1]
+            },
+            "bbox": {
+                "dtype": "float32",
+                "shape": [4]
+            },
+            "grasp": {
+                "dtype": "bool",
+                "shape": [1]
+            }
+        }
+    }
+    for name, dim in (vector_dims or {}).items():
+        if name in info["features"]:
+            info["features"][name]["shape"] = [dim]
+    return info
+
+
+def scan_data(root, workers=8):
+    """列出 data/ 下的 parquet 并只读 footer（按 size + mtime 缓存在 meta/ 下），返回 (文件列表, footers)。"""
+    data_root = os.path.join(root, "data")
+    meta_root = os.path.join(root, "meta")
+    os.makedirs(meta_root, exist_ok=True)
+    parquet_files = list_episode_files(data_root)
+    if not parquet_files:
+        raise RuntimeError(f"❌ {data_root} 中没有 parquet 文件")
+    footers = scan_footers(parquet_files, os.path.join(meta_root, FOOTER_CACHE_FILE), workers)
+    return parquet_files, footers
+
+
+def dataset_info(root, parquet_files, footers, total_tasks, chunks_size=1000, workers=8):
+    """
+    由 footer 汇总和视频 probe 缓存生成 info.json 的内容，返回 (info, 每个视频的 probe 结果)。
+    meta_builder.py 和 6get_info.py 共用，两者写出的 info.json 一致。
+    """
+    meta_root = os.path.join(root, "meta")
+    data = summarize_data(footers)
+    total_chunks = len({os.path.dirname(f) for f in parquet_files})
+
+    # ---------- videos/：属性取自 probe 缓存 ----------
+    videos = list_videos(os.path.join(root, "videos"))
+    video, probes = summarize_videos(videos, os.path.join(meta_root, PROBE_CACHE_FILE), workers)
+
+    # 数据帧率：1Parquet-csv2par.py 会在 meta/conversion.json 里记录实际的下采样步长和 fps；
+    # 没有该文件时沿用旧约定（视频为原始帧率，parquet 下采样 2 倍）
+    conversion = load_conversion(meta_root)
+    info = build_info(
+        total_episodes=data["total_episodes"],
+        total_frames=data["total_frames"],
+        total_tasks=total_tasks,
+        total_videos=len(videos),
+        total_chunks=total_chunks,
+        chunk_size=int(conversion.get("chunks_size", chunks_size)),
+        data_fps=float(conversion.get("fps", video["fps"] / 2)),
+        video=video,
+        vector_dims=data["vector_dims"],
+    )
+    return info, probes
+
+
+def build_meta(root, reorg_root=None, chunks_size=1000, workers=8):
+    meta_root = os.path.join(root, "meta")
+
+    # ---------- data/：只读 footer ----------
+    parquet_files, footers = scan_data(root, workers)
+
+    registry_path = os.path.join(meta_root, TASK_REGISTRY_FILE)
+    if os.path.exists(registry_path):
+        registry = TaskRegistry.load(registry_path)
+        used = {int(ft["min"]["task_index"]) for ft in footers}
+        tasks = registry.tasks(used)
+        episodes = build_episodes(footers, {t["task_index"]: t["task"] for t in tasks})
+    else:
+        if reorg_root is None:
+            raise FileNotFoundError(f"❌ {registry_path} 不存在，需要通过 --reorg_root 指定指令目录")
+        episodes = build_episodes(footers, load_instructions(reorg_root))
+        tasks = build_tasks(episodes)
+
+    info, _ = dataset_info(root, parquet_files, footers, len(tasks), chunks_size, workers)
+
+    # ---------- 写出 ----------
+    with open(os.path.join(meta_root, "episodes.jsonl"), "w", encoding="utf-8") as f:
+        f.write("\n".join(json.dumps(ep, ensure_ascii=False) for ep in episodes))
+    with open(os.path.join(meta_root, "tasks.jsonl"), "w", encoding="utf-8") as f:
+        for record in tasks:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    with open(os.path.join(meta_root, "info.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=4)
+    return episodes, tasks, info
+
+
+def main():
+    parser = argparse.ArgumentParser(description='一次扫描生成 episodes.jsonl / tasks.jsonl / info.json')
+    parser.add_argument('--root', required=True, help='LeRobot 数据集根目录（包含 data/ videos/ meta/）')
+    parser.add_argument('--reorg_root', default=None,
+                        help='包含 instruction.txt 的原始重组数据目录（没有 meta/task_registry.json 时需要）')
+    parser.add_argument('--chunks_size', type=int, default=1000,
+                        help='meta/conversion.json 中没有记录时使用的 chunks_size')
+    parser.add_argument('--workers', type=int, default=8, help='并行读取 footer / probe 视频的线程数')
+    args = parser.parse_args()
+
+    episodes, tasks, info = build_meta(args.root, args.reorg_root, args.chunks_size, args.workers)
+    print(f"✅ 已生成 episodes.jsonl / tasks.jsonl / info.json: "
+          f"{len(episodes)} 个 episode, {len(tasks)} 个任务, "
+          f"total_frames={info['total_frames']}, total_videos={info['total_videos']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+LeRobot parquet 的读写工具。
+
+state/action/bbox 默认由 pandas 写成 list<double> 的 object 列；
+fixed 模式下直接用连续的 numpy buffer 构造 FixedSizeList<float32>，
+读取时把扁平的 values reshape 成 (N,6)/(N,4)，不再逐行 np.stack。
+
+另外支持合并布局：所有 episode 写进少数几个大 parquet（每个 episode 一个 row group），
+配一个 episode_index → (文件, 行偏移, 长度, row group) 的 sidecar，按 episode O(1) 定位读取。
+"""
+
+import glob
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+VECTOR_COLUMNS = ("state", "action", "bbox")
+
+# 合并布局：<data_root>/consolidated/part-XXXX.parquet + episode_offsets.json
+CONSOLIDATED_DIR = "consolidated"
+OFFSETS_FILE = "episode_offsets.json"
+
+COLUMN_ORDER = [
+    "index", "episode_index", "frame_index", "timestamp",
+    "task_index", "state", "action", "bbox", "grasp"
+]
+
+
+def fixed_size_list_array(values, dtype=np.float32):
+    """(N,k) numpy → FixedSizeList<dtype>[k]，底层 buffer 直接复用 numpy 内存。"""
+    values = np.ascontiguousarray(values, dtype=dtype)
+    if values.ndim != 2:
+        raise ValueError(f"需要 (N,k) 数组，实际 shape={values.shape}")
+    flat = pa.array(values.reshape(-1))
+    return pa.FixedSizeListArray.from_arrays(flat, values.shape[1])
+
+
+def build_fixed_table(columns):
+    """
+    columns: {列名: numpy 数组}，向量列为 (N,k)，其余为 (N,)。
+    按 COLUMN_ORDER 生成 pyarrow.Table，向量列写成 FixedSizeList<float32>。
+    """
+    arrays = []
+    for name in COLUMN_ORDER:
+        values = columns[name]
+        if name in VECTOR_COLUMNS:
+            arrays.append(fixed_size_list_array(values))
+        else:
+            arrays.append(pa.array(np.asarray(values)))
+    return pa.Table.from_arrays(arrays, names=COLUMN_ORDER)
+
+
+def column_to_numpy(column):
+    """
+    pyarrow 列 → numpy：
+    - FixedSizeList：零拷贝 reshape 成 (N,k)
+    - 旧的 list 列：回退到 np.stack
+    - 标量列：(N,)
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+
+    if pa.types.is_fixed_size_list(column.type):
+        width = column.type.list_size
+        flat = column.flatten()  # 考虑 slice offset，只返回本段的 values
+        try:
+            values = flat.to_numpy(zero_copy_only=True)
+        except pa.ArrowInvalid:
+            values = flat.to_numpy(zero_copy_only=False)
+        return values.reshape(-1, width)
+
+    if pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+        if len(column) == 0:
+            return np.empty((0, 0), dtype=np.float64)
+        lengths = column.value_lengths().to_numpy(zero_copy_only=False)
+        if column.null_count == 0 and (lengths == lengths[0]).all():
+            # 等长 list：同样直接 reshape 扁平 values
+            return column.flatten().to_numpy(zero_copy_only=False).reshape(-1, int(lengths[0]))
+        return np.stack([np.asarray(v, dtype=np.float64) for v in column.to_pylist()])
+
+    return column.to_numpy(zero_copy_only=False)
+
+
+def read_columns(parquet_file, columns=None):
+    """读取 parquet 的指定列，返回 {列名: numpy 数组}。"""
+    table = pq.read_table(parquet_file, columns=columns)
+    return {name: column_to_numpy(table.column(name)) for name in table.column_names}
+
+
+def read_vector_column(parquet_file, name):
+    """读取单个向量列（如 action），返回 (N,k)。"""
+    return read_columns(parquet_file, [name])[name]
+
+
+def patch_columns(src_file, dst_file, values):
+    """重写 parquet 中的若干标量列（如 index/episode_index），其余列与元数据原样保留。"""
+    table = pq.read_table(src_file)
+    for name, arr in values.items():
+        i = table.schema.get_field_index(name)
+        field = table.schema.field(i)
+        table = table.set_column(i, field, pa.array(np.asarray(arr), type=field.type))
+    pq.write_table(table, dst_file)
+
+
+# ------------------- 合并布局 -------------------
+def consolidate_episodes(episode_files, out_dir, max_rows_per_file=1_000_000):
+    """
+    episode_files: [(episode_index, parquet_file)]，episode_index 需为 0..N-1 且按顺序给出。
+    把所有 episode 依次写进 out_dir/part-XXXX.parquet，每个 episode 单独一个 row group，
+    单个文件超过 max_rows_per_file 行后换下一个文件；最后写出 sidecar 并返回其内容。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(out_dir, "part-*.parquet")):
+        os.remove(old)
+
+    files, episodes = [], []
+    writer, rows_in_file, row_groups = None, 0, 0
+    try:
+        for expected, (episode_index, parquet_file) in enumerate(episode_files):
+            if episode_index != expected:
+                raise ValueError(f"episode_index 不连续: 期望 {expected}，实际 {episode_index}")
+            table = pq.read_table(parquet_file)
+            n = table.num_rows
+
+            if writer is None or (rows_in_file > 0 and rows_in_file + n > max_rows_per_file):
+                if writer is not None:
+                    writer.close()
+                files.append(f"part-{len(files):04d}.parquet")
+                writer = pq.ParquetWriter(os.path.join(out_dir, files[-1]), table.schema)
+                rows_in_file, row_groups = 0, 0
+
+            row_group = -1
+            if n > 0:
+                writer.write_table(table, row_group_size=n)
+                row_group = row_groups
+                row_groups += 1
+            episodes.append([len(files) - 1, rows_in_file, n, row_group])
+            rows_in_file += n
+    finally:
+        if writer is not None:
+            writer.close()
+
+    sidecar = {
+        "files": files,
+        "fields": ["file", "row_offset", "length", "row_group"],
+        "episodes": episodes,  # 下标即 episode_index
+    }
+    tmp_path = os.path.join(out_dir, OFFSETS_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(sidecar, f, separators=(",", ":"))
+    os.replace(tmp_path, os.path.join(out_dir, OFFSETS_FILE))
+    return sidecar
+
+
+class ConsolidatedDataset:
+    """
+    按 episode 读取合并布局的数据：
+        ds = ConsolidatedDataset("<dataset>/data")
+        table = ds.episode(123)                 # pyarrow.Table
+        arrays = ds.episode_arrays(123, ["action", "timestamp"])
+    文件以 memory_map 方式打开并缓存，每次只解码该 episode 所在的 row group。
+    """
+
+    def __init__(self, data_root):
+        self.root = os.path.join(data_root, CONSOLIDATED_DIR)
+        with open(os.path.join(self.root, OFFSETS_FILE), "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        self.files = sidecar["files"]
+        self.episodes = sidecar["episodes"]
+        self._handles = {}
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def _file(self, file_idx):
+        handle = self._handles.get(file_idx)
+        if handle is None:
+            handle = pq.ParquetFile(os.path.join(self.root, self.files[file_idx]), memory_map=True)
+            self._handles[file_idx] = handle
+        return handle
+
+    def locate(self, episode_index):
+        """返回 (文件路径, 行偏移, 长度)。"""
+        file_idx, row_offset, length, _ = self.episodes[episode_index]
+        return os.path.join(self.root, self.files[file_idx]), row_offset, length
+
+    def episode(self, episode_index, columns=None):
+        file_idx, _, length, row_group = self.episodes[episode_index]
+        handle = self._file(file_idx)
+        if row_group < 0:
+            return handle.schema_arrow.empty_table().select(columns or handle.schema_arrow.names)
+        return handle.read_row_group(row_group, columns=columns)
+
+    def episode_arrays(self, episode_index, columns=None):
+        table = self.episode(episode_index, columns)
+        return {name: column_to_numpy(table.column(name)) for name in table.column_names}
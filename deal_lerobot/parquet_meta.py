@@ -0,0 +1,60 @@
+"""
+只读 parquet footer 的元数据扫描。
+
+生成 episodes.jsonl / info.json 只需要每个 episode 的行数和几个索引列的取值范围，
+这些都在 footer 里（num_rows + 每个 row group 的列 min/max statistics），不必读数据页。
+- 多个文件用线程池并行读 footer（I/O 为主，线程即可）
+- 结果缓存在 meta/parquet_footer_cache.json，按文件 size + mtime 判断是否失效（file_cache）
+"""
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from file_cache import cached_map
+
+
+FOOTER_COLUMNS = ("index", "episode_index", "task_index")
+FOOTER_CACHE_FILE = "parquet_footer_cache.json"
+FOOTER_CACHE_VERSION = 3
+
+
+def read_footer(parquet_file, columns=FOOTER_COLUMNS):
+    """
+    只读 footer，返回 {"num_rows": int, "min": {列: 值}, "max": {列: 值}, "list_sizes": {列: k}}。
+    某列在某个 row group 里没有 statistics 时，只读这一列补上（pandas / pyarrow 默认都会写）。
+    list_sizes 为 FixedSizeList 向量列（fixed 布局）的维度；object 布局的 list 列在 schema 中没有维度，不出现。
+    """
+    metadata = pq.read_metadata(parquet_file)
+    schema = metadata.schema.to_arrow_schema()
+    # parquet 叶子列的下标与 arrow 字段下标不同（list 列的叶子路径为 "state.list.element" 等），按路径找
+    leaf_index = {metadata.schema.column(i).path: i for i in range(metadata.num_columns)}
+    mins, maxs = {}, {}
+    for name in columns:
+        col_idx = leaf_index.get(name)
+        if col_idx is None:
+            continue
+        lo = hi = None
+        for rg in range(metadata.num_row_groups):
+            column_meta = metadata.row_group(rg).column(col_idx)
+            stats = column_meta.statistics
+            if column_meta.num_values == 0:
+                continue
+            if stats is None or not stats.has_min_max:
+                values = pq.read_table(parquet_file, columns=[name]).column(name)
+                lo, hi = min(values.to_pylist()), max(values.to_pylist())
+                break
+            lo = stats.min if lo is None else min(lo, stats.min)
+            hi = stats.max if hi is None else max(hi, stats.max)
+        if lo is not None:
+            mins[name], maxs[name] = lo, hi
+    list_sizes = {field.name: field.type.list_size for field in schema if pa.types.is_fixed_size_list(field.type)}
+    return {"num_rows": metadata.num_rows, "min": mins, "max": maxs, "list_sizes": list_sizes}
+
+
+def scan_footers(parquet_files, cache_path=None, workers=8, columns=FOOTER_COLUMNS):
+    """
+    按 parquet_files 的顺序返回每个文件的 footer 信息（见 read_footer）。
+    cache_path 给出时，size 与 mtime 都没变的文件直接用缓存，只对新文件 / 改动过的文件读 footer。
+    """
+    return cached_map(lambda f: read_footer(f, columns), list(parquet_files), cache_path,
+                      FOOTER_CACHE_VERSION, list(columns), workers)
@@ -0,0 +1,60 @@
+"""
+raw 数据 data.csv 的快速读取。
+
+只解析需要的列（pyarrow.csv include_columns），列类型显式指定、不做类型推断，
+多线程解析，直接返回 numpy 数组：
+- 位置 / 四元数：float64（欧拉角与相对位姿对精度敏感）
+- bbox：float64（通常为 0~1000 的整数坐标，但 deal_raw/sync_bbox_from_json.py 可能写入小数，不能截断精度）
+
+需要 float32 的地方（parquet 的 FixedSizeList<float32> 列）在写出时再显式转换。
+"""
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+
+POS_COLUMNS = ["位置X", "位置Y", "位置Z"]
+QUAT_COLUMNS = ["姿态X", "姿态Y", "姿态Z", "姿态W"]
+BBOX_COLUMNS = ["bbox_x1", "bbox_y1", "bbox_x2", "bbox_y2"]
+
+COLUMN_TYPES = {
+    **{c: pa.float64() for c in POS_COLUMNS + QUAT_COLUMNS + BBOX_COLUMNS},
+}
+
+
+def read_raw_columns(csv_path, columns, use_threads=True, column_types=None):
+    """
+    只读取 columns 这些列，返回 {列名: (N,) numpy 数组}。
+    column_types 可覆盖默认列类型；缺少任何一列时抛 ValueError。
+    """
+    types = {c: COLUMN_TYPES[c] for c in columns if c in COLUMN_TYPES}
+    types.update(column_types or {})
+    read_options = pacsv.ReadOptions(use_threads=use_threads)
+    convert_options = pacsv.ConvertOptions(include_columns=list(columns), column_types=types)
+    try:
+        table = pacsv.read_csv(csv_path, read_options=read_options, convert_options=convert_options)
+    except KeyError as e:  # pyarrow.lib.ArrowKeyError
+        raise ValueError(f"CSV 缺少必要列: {csv_path} ({e})") from e
+    return {c: table.column(c).to_numpy() for c in columns}
+
+
+def stack_columns(arrays, columns):
+    """把若干 (N,) 列拼成 (N,k)。"""
+    return np.column_stack([arrays[c] for c in columns])
+
+
+def load_raw_episode(csv_path, with_bbox=True, use_threads=True):
+    """
+    读取单个 data.csv，返回：
+    {"pos": (N,3) float64, "quat": (N,4) float64 (x,y,z,w), "bbox": (N,4) float64（with_bbox 时）}
+    """
+    columns = POS_COLUMNS + QUAT_COLUMNS + (BBOX_COLUMNS if with_bbox else [])
+    arrays = read_raw_columns(csv_path, columns, use_threads=use_threads)
+    episode = {
+        "pos": stack_columns(arrays, POS_COLUMNS),
+        "quat": stack_columns(arrays, QUAT_COLUMNS),
+    }
+    if with_bbox:
+        episode["bbox"] = stack_columns(arrays, BBOX_COLUMNS)
+    return episode
@@ -1,49 +1,232 @@
-import pandas as pd
-import numpy as np
+"""
+流式查看 parquet（单 episode 文件或合并布局的 part-XXXX.parquet 都可以），可选导出 CSV。
+
+用 ParquetFile.iter_batches 逐个 record batch 读取，内存占用只与 --batch_size 有关、与文件大小无关：
+- --columns 只解码需要的列
+- --start/--stop 按文件内行号截取，整个落在范围外的 row group 直接跳过
+- --episodes 按 episode_index 过滤，先用 footer 里每个 row group 的 min/max 跳过无关 row group
+- list 列（state/action/bbox）用 numpy 按列批量格式化成保留 --precision 位小数的字符串，不再逐格 eval
+- --csv 按 batch 追加写出，不在内存里拼整张表
+
+用法：
+    python read.py <file.parquet> [--columns state action] [--start 0 --stop 100] [--episodes 3,5-7] [--csv [out.csv]]
+"""
+
+import argparse
 import os
 
-def format_list_column(df, colname):
-    """将列中的 list/array 格式化为保留四位小数的字符串"""
-    return df[colname].apply(
-        lambda x: "[" + ", ".join([f"{float(v):.4f}" for v in eval(x) if str(v) != 'nan']) + "]"
-        if isinstance(x, str) and x.startswith("[") else x
-    )
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+
+def parse_episodes(text):
+    """"3,5-7" → {3, 5, 6, 7}"""
+    episodes = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            episodes.update(range(int(lo), int(hi) + 1))
+        else:
+            episodes.add(int(part))
+    return episodes
+
+
+def format_list_array(array, precision=4):
+    """
+    list / FixedSizeList 列 → 形如 "[0.1234, 5.6789]" 的字符串数组。
+    等长 list 把扁平 values reshape 成 (N,k)，逐列做 np.char 拼接（k 次向量操作，与行数无关）；
+    不等长时先整体格式化扁平 values，再按 offsets 切分拼接。null 行保持为 null。
+    """
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    n = len(array)
+    if n == 0:
+        return pa.array([], type=pa.string())
+    fmt = f"%.{precision}f"
+    valid = array.is_valid().to_numpy(zero_copy_only=False)
+
+    if pa.types.is_fixed_size_list(array.type):
+        width = array.type.list_size
+        lengths = np.full(n, width)
+    else:
+        lengths = array.value_lengths().fill_null(0).to_numpy(zero_copy_only=False)
+        width = int(lengths[0])
+
+    if (lengths == width).all():
+        if array.null_count:
+            # null 行在 values 里可能不占位，先填成等长再 reshape
+            array = pc.if_else(array.is_valid(), array, pa.scalar([0.0] * width, type=array.type))
+        flat = array.flatten().to_numpy(zero_copy_only=False).astype(np.float64)
+        text = np.char.mod(fmt, flat).reshape(n, width) if width else np.empty((n, 0), dtype="U1")
+        out = np.full(n, "[")
+        for j in range(width):
+            out = np.char.add(out, text[:, j])
+            if j < width - 1:
+                out = np.char.add(out, ", ")
+        out = np.char.add(out, "]")
+    else:
+        flat = array.flatten().to_numpy(zero_copy_only=False).astype(np.float64)
+        text = np.char.mod(fmt, flat)
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        out = np.array(["[" + ", ".join(text[bounds[i]:bounds[i + 1]]) + "]" for i in range(n)])
+
+    out = out.astype(object)
+    out[~valid] = None
+    return pa.array(out, type=pa.string())
+
+
+def format_batch(batch, precision=4):
+    """把 batch 中的 list 列换成字符串列，其余列原样保留。"""
+    arrays = []
+    for column, field in zip(batch.columns, batch.schema):
+        if pa.types.is_list(field.type) or pa.types.is_large_list(field.type) \
+                or pa.types.is_fixed_size_list(field.type):
+            column = format_list_array(column, precision)
+        arrays.append(column)
+    return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
 
-def read_parquet(file_path: str, save_csv: bool = True):
+
+def select_row_groups(metadata, start=0, stop=None, episodes=None):
+    """
+    返回与行号范围 [start, stop) 有交集、且 episode_index 范围可能命中 episodes 的 row group，
+    以及每个选中 row group 在文件中的起始行号。
+    """
+    ep_col = None
+    if episodes:
+        for i in range(metadata.num_columns):
+            if metadata.schema.column(i).path == "episode_index":
+                ep_col = i
+                break
+
+    row_groups, offsets = [], []
+    offset = 0
+    for rg in range(metadata.num_row_groups):
+        meta = metadata.row_group(rg)
+        rg_start, rg_stop = offset, offset + meta.num_rows
+        offset = rg_stop
+        if rg_stop <= start or (stop is not None and rg_start >= stop) or meta.num_rows == 0:
+            continue
+        if ep_col is not None:
+            stats = meta.column(ep_col).statistics
+            if stats is not None and stats.has_min_max \
+                    and not any(stats.min <= ep <= stats.max for ep in episodes):
+                continue
+        row_groups.append(rg)
+        offsets.append(rg_start)
+    return row_groups, offsets
+
+
+def iter_batches(parquet_file, columns=None, start=0, stop=None, episodes=None, batch_size=65536):
+    """
+    逐个产出 (起始行号, 过滤后的 RecordBatch)。
+    过滤 episode 需要 episode_index 列，没投影时临时多读这一列，产出前去掉。
+    """
+    pf = pq.ParquetFile(parquet_file, memory_map=True)
+    names = pf.schema_arrow.names
+    columns = list(columns) if columns else names
+    missing = [c for c in columns if c not in names]
+    if missing:
+        raise ValueError(f"列不存在: {missing}（可选: {names}）")
+    read_columns = columns + (["episode_index"] if episodes and "episode_index" not in columns else [])
+    if episodes and "episode_index" not in names:
+        raise ValueError("文件中没有 episode_index 列，无法按 episode 过滤")
+    episode_set = pa.array(sorted(episodes), type=pa.int64()) if episodes else None
+
+    row_groups, offsets = select_row_groups(pf.metadata, start, stop, episodes)
+    for rg, rg_start in zip(row_groups, offsets):
+        # 逐个 row group 读，才能知道每个 batch 的文件行号
+        row = rg_start
+        for batch in pf.iter_batches(batch_size=batch_size, row_groups=[rg], columns=read_columns):
+            batch_start, n = row, batch.num_rows
+            row += n
+            lo = max(start - batch_start, 0)
+            hi = n if stop is None else min(stop - batch_start, n)
+            if hi <= lo:
+                if stop is not None and batch_start >= stop:
+                    return
+                continue
+            batch = batch.slice(lo, hi - lo)
+            if episode_set is not None:
+                ep = pc.cast(batch.column(read_columns.index("episode_index")), pa.int64())
+                batch = batch.filter(pc.is_in(ep, value_set=episode_set))
+                if len(read_columns) != len(columns):
+                    batch = batch.select(columns)
+            if batch.num_rows:
+                yield batch_start + lo, batch
+
+
+def print_summary(parquet_file):
+    """只读 footer：行数、row group 数和 schema。"""
+    metadata = pq.read_metadata(parquet_file)
+    print(f"✅ 文件 {parquet_file}")
+    print(f"📊 行数: {metadata.num_rows}，row group: {metadata.num_row_groups}，列数: {metadata.num_columns}")
+    print(f"🧾 schema:\n{metadata.schema.to_arrow_schema()}\n")
+
+
+def inspect(parquet_file, columns=None, start=0, stop=None, episodes=None, batch_size=65536,
+            precision=4, print_rows=20, csv_file=None):
+    print_summary(parquet_file)
+    writer = None
+    printed = total = 0
+    preview = []
     try:
-        # 设置显示完整内容，不省略
-        pd.set_option("display.max_colwidth", None)
-        pd.set_option("display.max_columns", None)
-        pd.set_option("display.width", None)
-        pd.set_option("display.max_rows", None)  # 显示所有行（取消行省略）
-
-        # 读取 parquet 文件
-        df = pd.read_parquet(file_path)
-
-        # 找出可能是 list 的列（比如 state.position / state.quaternion）
-        for col in df.columns:
-            if df[col].dtype == object:
-                try:
-                    df[col] = format_list_column(df, col)
-                except Exception:
-                    pass
-
-        print(f"✅ 文件 {file_path} 读取成功！")
-        print(f"📊 数据维度: {df.shape}")
-        print(f"🧾 列名: {list(df.columns)}\n")
-        print(df)
-
-        # 🚀 额外功能：保存为 CSV 文件
-        if save_csv:
-            # 自动生成 csv 文件名
-            csv_file = os.path.splitext(file_path)[0] + ".csv"
-            df.to_csv(csv_file, index=False, encoding="utf-8")
-            print(f"💾 已成功将数据保存为 CSV：{csv_file}")
-
-    except Exception as e:
-        print(f"❌ 读取失败: {e}")
+        for _, batch in iter_batches(parquet_file, columns, start, stop, episodes, batch_size):
+            formatted = format_batch(batch, precision)
+            total += formatted.num_rows
+            if print_rows < 0:
+                # 全部打印时逐 batch 输出，不攒在内存里
+                print(formatted.to_pandas().to_string(header=printed == 0, index=False))
+                printed += formatted.num_rows
+            elif printed < print_rows:
+                # 最多 print_rows 行，攒齐后一次打印，列对齐
+                preview.append(formatted.slice(0, print_rows - printed))
+                printed += preview[-1].num_rows
+            if csv_file is not None:
+                if writer is None:
+                    writer = pa_csv.CSVWriter(csv_file, formatted.schema)
+                writer.write_batch(formatted)
+            elif print_rows >= 0 and printed >= print_rows:
+                # 只打印时打印够了就不必继续读；导出 CSV 时要读完整个范围
+                break
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if preview:
+        print(pa.Table.from_batches(preview).to_pandas().to_string(index=False))
+    print(f"\n📋 已打印 {printed} 行")
+    if csv_file is not None and writer is None:
+        print("⚠️ 没有匹配的行，未写出 CSV")
+    elif csv_file is not None:
+        print(f"💾 已成功将 {total} 行保存为 CSV：{csv_file}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="流式查看 parquet 文件，可选导出 CSV")
+    parser.add_argument("file", help="parquet 文件路径")
+    parser.add_argument("--columns", nargs="+", default=None, help="只读取这些列（默认全部）")
+    parser.add_argument("--start", type=int, default=0, help="起始行号（文件内，含）")
+    parser.add_argument("--stop", type=int, default=None, help="结束行号（文件内，不含）")
+    parser.add_argument("--episodes", type=parse_episodes, default=None,
+                        help='只保留这些 episode_index，如 "3,5-7"')
+    parser.add_argument("--batch_size", type=int, default=65536, help="每个 record batch 的行数，决定内存占用")
+    parser.add_argument("--precision", type=int, default=4, help="list 列保留的小数位数")
+    parser.add_argument("--print_rows", type=int, default=20, help="最多打印多少行，-1 为全部打印")
+    parser.add_argument("--csv", nargs="?", const="", default=None,
+                        help="导出 CSV；不给路径时写到 parquet 同目录同名 .csv")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    # 🔧 在这里设置 parquet 文件路径
-    file_path = r"/home/duanzhibo/wall-x/datasets/dzb/our_data_tiny/data/chunk-000/episode_000000.parquet"
-    read_parquet(file_path)
+    args = parse_args()
+    csv_file = args.csv
+    if csv_file == "":
+        csv_file = os.path.splitext(args.file)[0] + ".csv"
+    inspect(args.file, args.columns, args.start, args.stop, args.episodes, args.batch_size,
+            args.precision, args.print_rows, csv_file)
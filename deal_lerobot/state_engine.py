@@ -0,0 +1,55 @@
+"""
+批量位姿 → 相对 state / action 计算。
+
+整段 episode 的位置 (N,3) 与四元数 (N,4，顺序 x,y,z,w) 一次性向量化处理：
+- state  = [相对首帧的 xyz, 相对首帧并 wrap 到 [-pi, pi) 的欧拉角 xyz]
+- action = 下一帧的 state（最后一帧沿用自身）
+"""
+
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+
+# ------------------- quaternion 工具 -------------------
+def quat_normalize(q):
+    """逐行归一化四元数，范数为 0 的行保持不变。支持 (4,) 或 (N,4)。"""
+    q = np.asarray(q, dtype=float)
+    n = np.linalg.norm(q, axis=-1, keepdims=True)
+    n = np.where(n == 0, 1.0, n)
+    return q / n
+
+
+def quat_to_euler(quat):
+    """(N,4) 四元数 (x,y,z,w) → (N,3) 欧拉角 'xyz'（弧度），一次构造 Rotation。"""
+    quat = quat_normalize(quat)
+    return R.from_quat(quat).as_euler('xyz', degrees=False)
+
+
+# ------------------- state / action -------------------
+def wrap_angle(a):
+    """把角度 wrap 到 [-pi, pi)。"""
+    return (a + np.pi) % (2 * np.pi) - np.pi
+
+
+def relative_states(pos, quat):
+    """
+    pos: (N,3) 位置，quat: (N,4) 四元数 (x,y,z,w)
+    返回 (N,6) float64：[rel_x, rel_y, rel_z, rel_roll, rel_pitch, rel_yaw]，均相对第 0 帧。
+    """
+    pos = np.asarray(pos, dtype=float)
+    quat = np.asarray(quat, dtype=float)
+    if pos.shape[0] == 0:
+        return np.empty((0, 6), dtype=float)
+
+    rel_pos = pos - pos[0]
+    euler = quat_to_euler(quat)
+    rel_euler = wrap_angle(euler - euler[0])
+    return np.concatenate([rel_pos, rel_euler], axis=1)
+
+
+def next_state_actions(states):
+    """action[i] = state[i+1]，最后一帧 action = 自身 state。通过数组平移得到。"""
+    states = np.asarray(states)
+    if states.shape[0] == 0:
+        return states.copy()
+    return np.concatenate([states[1:], states[-1:]], axis=0)
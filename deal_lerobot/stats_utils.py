@@ -0,0 +1,331 @@
+"""
+episode 统计量的流式累积与合并。
+
+RunningStats 按通道维护 count / mean / M2 / min / max（Welford），
+内存只与通道数有关，与样本数（帧数）无关。
+多个 RunningStats 可用并行方差公式（Chan et al.）合并，
+因此每个 episode 的部分矩可以在不同进程中计算，再在父进程汇总成数据集级统计，
+不需要再读一遍数据。M2 = sum((x - mean)^2) 与 (sum, sumsq) 等价，但数值上更稳定。
+"""
+
+import cv2
+import numpy as np
+
+try:
+    # 可选依赖：有 PyAV 时近似模式由解码器按关键帧 seek、只解码需要的帧，并在解码阶段降分辨率
+    import av
+except ImportError:
+    av = None
+
+
+class RunningStats:
+    """逐样本或逐批累积的 per-channel 统计量；std 为总体标准差（与 np.std 默认一致）。"""
+
+    def __init__(self, dim):
+        self.count = 0
+        self.mean = np.zeros(dim, dtype=np.float64)
+        self.m2 = np.zeros(dim, dtype=np.float64)
+        self.min = np.full(dim, np.inf, dtype=np.float64)
+        self.max = np.full(dim, -np.inf, dtype=np.float64)
+
+    @classmethod
+    def from_array(cls, arr):
+        """由 (N,) 或 (N,dim) 数组一次性得到部分矩。"""
+        arr = np.asarray(arr, dtype=np.float64)
+        if arr.ndim == 1:
+            arr = arr[:, None]
+        stats = cls(arr.shape[1])
+        if arr.shape[0] == 0:
+            return stats
+        stats.count = arr.shape[0]
+        stats.mean = arr.mean(axis=0)
+        stats.m2 = ((arr - stats.mean) ** 2).sum(axis=0)
+        stats.min = arr.min(axis=0)
+        stats.max = arr.max(axis=0)
+        return stats
+
+    @classmethod
+    def from_dict(cls, stats):
+        """由 to_dict() 的输出（episodes_stats.jsonl 中的一项）还原部分矩：M2 = std^2 * count，无需原始数据。"""
+        flat = lambda v: np.asarray(v, dtype=np.float64).reshape(-1)
+        count = int(stats["count"][0])
+        result = cls(len(flat(stats["mean"])))
+        if count == 0:
+            return result
+        result.count = count
+        result.mean = flat(stats["mean"])
+        result.m2 = flat(stats["std"]) ** 2 * count
+        result.min = flat(stats["min"])
+        result.max = flat(stats["max"])
+        return result
+
+    def merge(self, other):
+        """并行方差公式：把 other 的部分矩合并进来，返回 self。"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count = other.count
+            self.mean = other.mean.copy()
+            self.m2 = other.m2.copy()
+            self.min = other.min.copy()
+            self.max = other.max.copy()
+            return self
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / n)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * (self.count * other.count / n)
+        self.count = n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    def update(self, x):
+        """x: (dim,) 单个样本。"""
+        x = np.asarray(x, dtype=np.float64)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        np.minimum(self.min, x, out=self.min)
+        np.maximum(self.max, x, out=self.max)
+
+    @property
+    def var(self):
+        if self.count == 0:
+            return np.zeros_like(self.m2)
+        return self.m2 / self.count
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    def mean_stderr(self, population=None):
+        """
+        把样本视为总体的简单随机抽样时，mean 的标准误差 std/sqrt(n)；
+        给出总体大小 population 时乘上有限总体修正 sqrt((N-n)/(N-1))（全量时为 0）。
+        """
+        if self.count == 0:
+            return np.zeros_like(self.m2)
+        stderr = np.sqrt(self.m2 / max(self.count - 1, 1) / self.count)
+        if population is not None and population > 1:
+            stderr = stderr * np.sqrt(max(population - self.count, 0) / (population - 1))
+        return stderr
+
+    def to_dict(self, nested=False):
+        """转成 stats 字段；nested=True 时每个通道再套一层 []（video 特征的格式）。"""
+        fmt = (lambda a: [[float(v)] for v in a]) if nested else (lambda a: [float(v) for v in a])
+        return {
+            "min": fmt(self.min),
+            "max": fmt(self.max),
+            "mean": fmt(self.mean),
+            "std": fmt(self.std),
+            "count": [int(self.count)],
+        }
+
+
+def feature_stats(columns):
+    """
+    对一个 episode 的所有列（{列名: (N,) 或 (N,k) 数组}）计算统计量。
+    返回 (stats, partials)：stats 为 episodes_stats.jsonl 中的格式（先转 float32 再统计），
+    partials 为对应的 RunningStats，用于合并成数据集级统计。
+    """
+    stats = {}
+    partials = {}
+    for feature, arr in columns.items():
+        arr = np.asarray(arr).astype(np.float32)
+        if arr.ndim == 2:
+            min_val = arr.min(axis=0).tolist()
+            max_val = arr.max(axis=0).tolist()
+            mean_val = arr.mean(axis=0).tolist()
+            std_val = arr.std(axis=0).tolist()
+        else:
+            min_val = [float(arr.min())]
+            max_val = [float(arr.max())]
+            mean_val = [float(arr.mean())]
+            std_val = [float(arr.std())]
+
+        stats[feature] = {
+            "min": min_val,
+            "max": max_val,
+            "mean": mean_val,
+            "std": std_val,
+            "count": [len(arr)]
+        }
+        partials[feature] = RunningStats.from_array(arr)
+    return stats, partials
+
+
+def frame_channel_means(frame_bgr, pixel_step=1):
+    """
+    单帧 BGR uint8 → RGB 三通道均值（归一化到 [0,1]）。
+    pixel_step > 1 时按步长隔行隔列取像素（最近邻降采样，只是视图不拷贝）再求均值。
+    """
+    if pixel_step > 1:
+        frame_bgr = frame_bgr[::pixel_step, ::pixel_step]
+    b, g, r, _ = cv2.mean(frame_bgr)
+    return np.array([r, g, b], dtype=np.float64) / 255.0
+
+
+def video_channel_stats(video_path):
+    """
+    逐帧解码视频，每帧只保留 3 个通道均值并送入 RunningStats，
+    峰值内存与视频长度无关。返回 RunningStats（样本 = 帧的通道均值）。
+    """
+    stats = RunningStats(3)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            stats.update(frame_channel_means(frame))
+    finally:
+        cap.release()
+    return stats
+
+
+def sample_frame_indices(total_frames, frame_step=1, num_samples=0, seed=0):
+    """近似模式要取的帧号（升序）：num_samples > 0 时无放回随机抽样，否则每 frame_step 帧取 1 帧。"""
+    if num_samples > 0:
+        rng = np.random.default_rng(seed)
+        k = min(num_samples, total_frames)
+        return np.sort(rng.choice(total_frames, size=k, replace=False)) if k > 0 else np.empty(0, dtype=np.int64)
+    return np.arange(0, total_frames, max(1, frame_step))
+
+
+class SampledFrameDecoder:
+    """
+    用 PyAV 只解码指定帧：
+    - 先只解复用一遍（不解码）拿到总帧数和关键帧位置
+    - 对每个目标帧，若它之前最近的关键帧在当前解码位置之后，直接 seek 到该关键帧，
+      中间的帧不再解码；否则从当前位置顺序解码过去
+    - pixel_step > 1 时打开解码器时设 lowres（mpeg4 / mjpeg 等在 IDCT 阶段直接输出 1/2^k 分辨率，
+      不支持的编码由 ffmpeg 自动降为 0），再由 swscale 缩放到 1/pixel_step
+    decoded 记录实际解码出的帧数。
+    """
+
+    def __init__(self, video_path, pixel_step=1):
+        self.container = av.open(video_path)
+        self.stream = self.container.streams.video[0]
+        self.pixel_step = max(1, int(pixel_step))
+        self.decoded = 0
+
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.frame_duration = 1.0 / (float(rate) * float(self.stream.time_base))  # 每帧的 pts 间隔
+        pts, keyframe = [], []
+        for packet in self.container.demux(self.stream):
+            if packet.size == 0 or packet.pts is None:
+                continue
+            pts.append(packet.pts)
+            keyframe.append(packet.is_keyframe)
+        order = np.argsort(pts, kind="stable")  # 显示顺序（有 B 帧时与解码顺序不同）
+        self.start_pts = pts[order[0]] if pts else 0
+        self.total_frames = len(pts)
+        self.keyframes = np.flatnonzero(np.asarray(keyframe, dtype=bool)[order]) if pts else np.empty(0, np.int64)
+
+        ctx = self.stream.codec_context
+        ctx.thread_type = "AUTO"
+        # 开启 lowres 后 codec_context 的宽高会变成解码输出的尺寸，先记下原始分辨率
+        self.width, self.height = ctx.width, ctx.height
+        if self.pixel_step > 1:
+            ctx.options = {"lowres": str(min(int(np.log2(self.pixel_step)), 3))}
+        self._frames = None
+        self.position = -1  # 最近一次解码出的帧号
+
+    def _frame_index(self, frame):
+        return int(round((frame.pts - self.start_pts) / self.frame_duration))
+
+    def _seek(self, index):
+        self.container.seek(int(self.start_pts + index * self.frame_duration), stream=self.stream,
+                            backward=True, any_frame=False)
+        self._frames = self.container.decode(self.stream)
+        self.position = index - 1
+
+    def frames(self, indices):
+        """按升序帧号逐个产出 (帧号, BGR uint8 帧)；帧已按 pixel_step 缩小。"""
+        for target in indices:
+            i = np.searchsorted(self.keyframes, target, side="right") - 1
+            keyframe = int(self.keyframes[i]) if i >= 0 else 0
+            if self._frames is None or keyframe > self.position + 1:
+                self._seek(keyframe)
+            for frame in self._frames:
+                self.decoded += 1
+                self.position = self._frame_index(frame)
+                if self.position >= target:
+                    break
+            else:
+                return
+            if self.position != target:
+                continue
+            yield target, self._to_bgr(frame)
+
+    def _to_bgr(self, frame):
+        if self.pixel_step > 1:
+            w = max(1, self.width // self.pixel_step)
+            h = max(1, self.height // self.pixel_step)
+            return frame.to_ndarray(format="bgr24", width=w, height=h)
+        return frame.to_ndarray(format="bgr24")
+
+    def close(self):
+        self.container.close()
+
+
+def sample_video_channel_stats(video_path, frame_step=1, num_samples=0, pixel_step=1, seed=0):
+    """
+    近似版 video_channel_stats：只对部分帧求通道均值。
+    - frame_step：每 frame_step 帧取 1 帧
+    - num_samples > 0：改为在全部帧中无放回随机抽 num_samples 帧（seed 固定，结果可复现）
+    - pixel_step：每帧只用 1/pixel_step 分辨率的像素
+    装了 PyAV 时由 SampledFrameDecoder 按关键帧 seek、在解码器里降分辨率，跳过的帧不解码；
+    否则退回 OpenCV：跳过的帧仍要 grab()（解码但不做颜色转换），pixel_step 为解码后隔点取样。
+    返回 (RunningStats, total_frames)；total_frames 为视频总帧数，用于有限总体修正和 timestamp。
+    """
+    if av is not None:
+        stats, total_frames, _ = _sample_stats_pyav(video_path, frame_step, num_samples, pixel_step, seed)
+        return stats, total_frames
+    return _sample_stats_opencv(video_path, frame_step, num_samples, pixel_step, seed)
+
+
+def _sample_stats_pyav(video_path, frame_step, num_samples, pixel_step, seed):
+    """返回 (RunningStats, total_frames, 实际解码帧数)。"""
+    stats = RunningStats(3)
+    decoder = SampledFrameDecoder(video_path, pixel_step)
+    try:
+        total_frames = decoder.total_frames
+        wanted = sample_frame_indices(total_frames, frame_step, num_samples, seed)
+        for _, frame in decoder.frames(wanted):
+            # 已在解码阶段缩小，这里不再隔点取样
+            stats.update(frame_channel_means(frame))
+        return stats, total_frames, decoder.decoded
+    finally:
+        decoder.close()
+
+
+def _sample_stats_opencv(video_path, frame_step, num_samples, pixel_step, seed):
+    stats = RunningStats(3)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if num_samples > 0:
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            wanted = sample_frame_indices(total_frames, frame_step, num_samples, seed)
+            pos = 0
+            for target in wanted:
+                while pos < target and cap.grab():
+                    pos += 1
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                pos += 1
+                stats.update(frame_channel_means(frame, pixel_step))
+        else:
+            total_frames = 0
+            while cap.grab():
+                if total_frames % frame_step == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    stats.update(frame_channel_means(frame, pixel_step))
+                total_frames += 1
+    finally:
+        cap.release()
+    return stats, total_frames
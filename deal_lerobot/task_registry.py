@@ -0,0 +1,81 @@
+"""
+持久化的任务表：规范化后的指令文本 → task_index，保存在 meta/task_registry.json。
+
+1Parquet-csv2par.py 写 parquet 的 task_index、meta_builder.py / 4Episode2tasks.py 写 tasks.jsonl 都查这张表，
+不再依赖“任务类型目录的序号”和“指令第一次出现的顺序”恰好对得上：
+- 查找 / 分配都是 dict 的 O(1) 操作
+- 已登记的指令永远沿用原来的 task_index，重建或追加数据时只给新指令分配新编号，已有 parquet 不用改写
+- 规范化（NFKC + 去首尾空白 + 合并连续空白）后相同的指令视为同一个任务，记录第一次登记时的原文
+"""
+
+import json
+import os
+import unicodedata
+
+
+TASK_REGISTRY_FILE = "task_registry.json"
+TASK_REGISTRY_VERSION = 1
+
+
+def normalize_instruction(text):
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class TaskRegistry:
+    def __init__(self, tasks=None):
+        # tasks: [{"task_index": int, "task": str}]
+        self._tasks = {}
+        self._index = {}
+        self._next_index = 0
+        for record in tasks or []:
+            self._add(int(record["task_index"]), record["task"])
+
+    def _add(self, task_index, task):
+        key = normalize_instruction(task)
+        if key in self._index and self._index[key] != task_index:
+            raise ValueError(f"任务表中同一指令对应了两个 task_index: {task!r}")
+        self._index[key] = task_index
+        self._tasks[task_index] = task
+        self._next_index = max(self._next_index, task_index + 1)
+
+    @classmethod
+    def load(cls, path):
+        """读取任务表；文件不存在时返回空表。"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != TASK_REGISTRY_VERSION:
+            raise ValueError(f"不支持的任务表版本: {path} (version={data.get('version')})")
+        return cls(data["tasks"])
+
+    def save(self, path):
+        parent = os.path.dirname(path)
+        if parent:  # 只给文件名时写到当前目录
+            os.makedirs(parent, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": TASK_REGISTRY_VERSION, "tasks": self.tasks()}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def get(self, instruction):
+        """已登记时返回 task_index，否则返回 None。"""
+        return self._index.get(normalize_instruction(instruction))
+
+    def task_index(self, instruction):
+        """返回指令的 task_index，未登记过的分配下一个编号。"""
+        key = normalize_instruction(instruction)
+        if key not in self._index:
+            self._add(self._next_index, instruction.strip())
+        return self._index[key]
+
+    def task(self, task_index):
+        return self._tasks[task_index]
+
+    def tasks(self, used=None):
+        """按 task_index 排序的 [{"task_index", "task"}]；给出 used 时只保留其中的 task_index。"""
+        return [{"task_index": i, "task": self._tasks[i]} for i in sorted(self._tasks)
+                if used is None or i in used]
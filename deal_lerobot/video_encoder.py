@@ -0,0 +1,144 @@
+"""
+视频编码后端。
+
+- opencv：cv2.VideoWriter + mp4v（旧行为，只能得到 mpeg4，体积大、训练时解码慢）
+- ffmpeg：把 BGR 原始帧通过管道送给 ffmpeg 子进程编码，可选 libx264 / libx265 / libsvtav1，
+  并可设置 CRF、preset、GOP；请求的编码器不可用时退回 mpeg4
+
+两种后端的 writer 接口相同（write(frame) / release()），调用方不用区分。
+编码器是否可用只在父进程里查一次（resolve_encoding），结果随编码参数传给各个 worker。
+"""
+
+import functools
+import shutil
+import subprocess
+
+import cv2
+
+
+# ffmpeg 编码器名 → 写进 info.json 的 codec 名（与 ffprobe 的 codec_name 一致）
+ENCODER_CODECS = {
+    "libx264": "h264",
+    "libx265": "hevc",
+    "libsvtav1": "av1",
+    "libaom-av1": "av1",
+    "mpeg4": "mpeg4",
+}
+FALLBACK_ENCODER = "mpeg4"
+
+
+@functools.lru_cache(maxsize=None)
+def available_encoders():
+    """当前 ffmpeg 支持的编码器名集合；没有 ffmpeg 时为空。"""
+    if not shutil.which("ffmpeg"):
+        return frozenset()
+    out = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"],
+                         capture_output=True, text=True).stdout
+    encoders = set()
+    for line in out.splitlines():
+        parts = line.split()
+        # 形如 " V....D libx264   libx264 H.264 ..."，跳过表头说明
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS" and parts[1] != "=":
+            encoders.add(parts[1])
+    return frozenset(encoders)
+
+
+def resolve_encoding(backend="opencv", codec="libx264", crf=None, preset=None, gop=None, fps=5):
+    """
+    确定实际使用的编码参数，返回 dict（可直接传给 open_writer，也可 pickle 给 worker）。
+    ffmpeg 后端下请求的编码器不可用时退回 mpeg4 并打印提示；没有 ffmpeg 时报错。
+    """
+    if backend == "opencv":
+        return {"backend": "opencv", "encoder": "mp4v", "codec": "mpeg4", "fps": fps}
+    if backend != "ffmpeg":
+        raise ValueError(f"未知的编码后端: {backend}")
+
+    encoders = available_encoders()
+    if not encoders:
+        raise RuntimeError("未找到 ffmpeg，无法使用 ffmpeg 编码后端")
+    encoder = codec
+    if encoder not in encoders:
+        print(f"⚠️ ffmpeg 不支持编码器 {codec}，退回 {FALLBACK_ENCODER}")
+        encoder = FALLBACK_ENCODER
+    return {
+        "backend": "ffmpeg",
+        "encoder": encoder,
+        "codec": ENCODER_CODECS.get(encoder, encoder),
+        "crf": crf,
+        "preset": preset,
+        "gop": gop,
+        "fps": fps,
+        "pix_fmt": "yuv420p",
+    }
+
+
+def ffmpeg_command(video_path, width, height, encoding):
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(encoding["fps"]),
+        "-i", "-",
+        "-an", "-c:v", encoding["encoder"], "-pix_fmt", encoding["pix_fmt"],
+    ]
+    if width % 2 or height % 2:
+        # yuv420p 要求宽高为偶数
+        cmd += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+    if encoding.get("crf") is not None:
+        if encoding["encoder"] == FALLBACK_ENCODER:
+            # mpeg4 没有 CRF，用固定量化参数（1~31，越小质量越高）
+            cmd += ["-q:v", str(min(max(int(encoding["crf"]), 1), 31))]
+        else:
+            cmd += ["-crf", str(encoding["crf"])]
+    if encoding.get("preset") is not None and encoding["encoder"] != FALLBACK_ENCODER:
+        cmd += ["-preset", str(encoding["preset"])]
+    if encoding.get("gop") is not None:
+        cmd += ["-g", str(encoding["gop"])]
+    cmd.append(video_path)
+    return cmd
+
+
+class FfmpegWriter:
+    """与 cv2.VideoWriter 相同用法的 ffmpeg 管道 writer，帧为 (H,W,3) BGR uint8。release() 可重复调用。"""
+
+    def __init__(self, video_path, width, height, encoding):
+        self.video_path = video_path
+        self.size = (width, height)
+        self.proc = subprocess.Popen(ffmpeg_command(video_path, width, height, encoding),
+                                     stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.closed = False
+        self.stderr = b""
+
+    def write(self, frame):
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            # cv2.VideoWriter 会静默丢弃尺寸不符的帧，这里缩放到首帧尺寸，保证帧数不变
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        try:
+            self.proc.stdin.write(frame.tobytes())
+        except BrokenPipeError:
+            # ffmpeg 已提前退出：等它结束并带上它自己的报错，调用方 finally 里的 release() 不会再重复收尾
+            returncode = self._finish()
+            raise RuntimeError(f"ffmpeg 提前退出 (returncode={returncode}): {self.video_path}\n"
+                               f"{self.stderr.decode(errors='replace')}") from None
+
+    def _finish(self):
+        """关闭 stdin、读完 stderr 并等待进程结束，只执行一次；返回 returncode。"""
+        if not self.closed:
+            self.closed = True
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            self.stderr = self.proc.stderr.read()
+            self.proc.stderr.close()
+        return self.proc.wait()
+
+    def release(self):
+        if self.closed:
+            return
+        if self._finish() != 0:
+            raise RuntimeError(f"ffmpeg 编码失败: {self.video_path}\n{self.stderr.decode(errors='replace')}")
+
+
+def open_writer(video_path, width, height, encoding):
+    if encoding["backend"] == "ffmpeg":
+        return FfmpegWriter(video_path, width, height, encoding)
+    return cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), encoding["fps"], (width, height))
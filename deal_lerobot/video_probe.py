@@ -0,0 +1,96 @@
+"""
+视频属性 probe（fps / 分辨率 / 编码 / 像素格式 / 帧数），结果按 size + mtime 缓存在 meta/ 下。
+
+优先用 ffprobe 读容器和流头信息，不解码；没有 ffprobe 时退回 OpenCV 读同样的属性。
+"""
+
+import json
+import shutil
+import subprocess
+from fractions import Fraction
+
+from file_cache import cached_map
+
+
+PROBE_CACHE_FILE = "video_probe_cache.json"
+PROBE_CACHE_VERSION = 1
+
+# OpenCV 只给出 fourcc，换成 ffprobe 的 codec_name，保证两种后端写出的 info.json 一致
+FOURCC_CODECS = {
+    "mp4v": "mpeg4",
+    "fmp4": "mpeg4",
+    "avc1": "h264",
+    "h264": "h264",
+    "hev1": "hevc",
+    "hvc1": "hevc",
+    "av01": "av1",
+}
+
+
+def _parse_rate(rate):
+    try:
+        value = Fraction(rate)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 0.0
+    return float(value)
+
+
+def probe_with_ffprobe(video_path):
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=codec_name,width,height,pix_fmt,avg_frame_rate,r_frame_rate,nb_frames",
+        "-of", "json", video_path,
+    ]
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    streams = json.loads(out).get("streams", [])
+    if not streams:
+        raise RuntimeError(f"❌ 没有视频流: {video_path}")
+    stream = streams[0]
+    frames = stream.get("nb_frames")
+    if frames in (None, "N/A"):
+        # 容器里没有帧数时数一遍 packet（只解复用，不解码）
+        cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-count_packets",
+               "-show_entries", "stream=nb_read_packets", "-of", "json", video_path]
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        frames = json.loads(out)["streams"][0].get("nb_read_packets", 0)
+    return {
+        "fps": _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate")),
+        "width": int(stream["width"]),
+        "height": int(stream["height"]),
+        "codec": stream.get("codec_name"),
+        "pix_fmt": stream.get("pix_fmt"),
+        "frames": int(frames),
+    }
+
+
+def probe_with_opencv(video_path):
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"❌ 无法打开视频: {video_path}")
+    try:
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        tag = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip().lower()
+        return {
+            "fps": float(cap.get(cv2.CAP_PROP_FPS)),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "codec": FOURCC_CODECS.get(tag, tag or None),
+            "pix_fmt": None,
+            "frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        }
+    finally:
+        cap.release()
+
+
+def probe_video(video_path):
+    """返回 {"fps", "width", "height", "codec", "pix_fmt", "frames"}；pix_fmt 仅 ffprobe 后端提供。"""
+    if shutil.which("ffprobe"):
+        return probe_with_ffprobe(video_path)
+    return probe_with_opencv(video_path)
+
+
+def probe_videos(video_paths, cache_path=None, workers=8):
+    """按 video_paths 的顺序返回 probe_video 的结果，未改动的视频直接用缓存。"""
+    return cached_map(probe_video, list(video_paths), cache_path, PROBE_CACHE_VERSION, None, workers)
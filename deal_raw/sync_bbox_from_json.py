@@ -19,8 +19,10 @@ import sys
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 
-BBOX_COLUMNS = ["bbox_x1", "bbox_y1", "bbox_x2", "bbox_y2"]
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deal_lerobot"))
+from raw_loader import BBOX_COLUMNS, read_raw_columns  # noqa: E402
 
 
 def _coerce_index(value: Any) -> Optional[int]:
@@ -101,6 +103,23 @@ def _format_bbox_value(value: float) -> str:
     return str(value)
 
 
+def _bbox_up_to_date(csv_path: Path, index_map: Dict[int, List[float]]) -> bool:
+    """
+    Read only the bbox columns and compare them with what _update_csv would write.
+    Unchanged files are left untouched so their mtime (and downstream rebuilds) stay put.
+    """
+    try:
+        cols = read_raw_columns(csv_path, BBOX_COLUMNS)
+    except ValueError:
+        return False  # bbox columns missing
+    current = np.column_stack([cols[c] for c in BBOX_COLUMNS])
+    expected = np.zeros_like(current)
+    for idx, bbox in index_map.items():
+        if 0 <= idx < len(expected):
+            expected[idx] = bbox
+    return bool(np.array_equal(current, expected))
+
+
 def _update_csv(csv_path: Path, index_map: Dict[int, List[float]], dry_run: bool) -> Dict[str, int]:
     stats = {
         "rows": 0,
@@ -192,6 +211,7 @@ def main() -> int:
     processed = 0
     skipped = 0
     updated = 0
+    unchanged = 0
     for json_path in json_files:
         csv_path = json_path.with_name("data.csv")
         if not csv_path.exists():
@@ -206,14 +226,19 @@ def main() -> int:
             skipped += 1
             continue
 
+        rel = json_path.parent.relative_to(root)
         try:
+            if _bbox_up_to_date(csv_path, index_map):
+                print(f"[SAME] {rel}: bbox already in sync")
+                processed += 1
+                unchanged += 1
+                continue
             stats = _update_csv(csv_path, index_map, args.dry_run)
         except Exception as exc:
             print(f"[SKIP] {csv_path}: {exc}", file=sys.stderr)
             skipped += 1
             continue
 
-        rel = json_path.parent.relative_to(root)
         print(
             f"[OK] {rel}: rows={stats['rows']}, "
             f"missing_index={stats['missing_index']}, "
@@ -226,7 +251,7 @@ def main() -> int:
         updated += 1
 
     print(
-        f"Done. processed={processed}, skipped={skipped}, dry_run={args.dry_run}",
+        f"Done. processed={processed}, unchanged={unchanged}, skipped={skipped}, dry_run={args.dry_run}",
         file=sys.stderr,
     )
     return 0
@@ -12,18 +12,17 @@ from __future__ import annotations
 
 import math
 import json
+import sys
 from pathlib import Path
 from typing import Iterable
 
 import numpy as np
-import pandas as pd
-from scipy.spatial.transform import Rotation as R
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deal_lerobot"))
+from raw_loader import load_raw_episode  # noqa: E402
+from state_engine import quat_to_euler  # noqa: E402
 
-def quat_normalize(q: np.ndarray) -> np.ndarray:
-    n = np.linalg.norm(q, axis=-1, keepdims=True)
-    n = np.where(n == 0, 1.0, n)
-    return q / n
+from stop_frame import find_stop_frame  # noqa: E402
 
 
 def load_actions_from_csv(csv_path: Path) -> np.ndarray:
@@ -32,62 +31,13 @@ def load_actions_from_csv(csv_path: Path) -> np.ndarray:
     [pos_x, pos_y, pos_z, roll, pitch, yaw]
     yaw 由四元数转欧拉得到。
     """
-    df = pd.read_csv(csv_path)
-    required = ["位置X", "位置Y", "位置Z", "姿态X", "姿态Y", "姿态Z", "姿态W"]
-    if not all(c in df.columns for c in required):
-        raise ValueError(f"{csv_path} 缺少必要列 {required}")
-
-    pos = df[["位置X", "位置Y", "位置Z"]].to_numpy(dtype=float)
-    quat = df[["姿态X", "姿态Y", "姿态Z", "姿态W"]].to_numpy(dtype=float)
-    quat = quat_normalize(quat)
-    euler = R.from_quat(quat).as_euler("xyz", degrees=False)
+    episode = load_raw_episode(csv_path, with_bbox=False)
+    pos = episode["pos"]
+    euler = quat_to_euler(episode["quat"])
     actions = np.concatenate([pos, euler], axis=1)  # (N,6)
     return actions
 
 
-def find_stop_frame(
-    actions: np.ndarray,
-    *,
-    r_pos: float = 0,
-    r_yaw: float = 0,
-    pos_min: float = 0.2,
-    yaw_min: float = 0.4,
-    k: int = 2,
-    hist_ratio: float = 0.8,
-) -> tuple[int, float, float]:
-    """
-    Return (stop_frame_index, pos_threshold, yaw_threshold).
-
-    逻辑：对每帧与“最终帧”比较的 pos/yaw 差，估计前段尺度，找到末尾连续 k 帧稳定段的起点。
-    """
-    if actions.shape[0] < 2:
-        return 0, pos_min, yaw_min
-
-    pose = actions[:, [0, 1, 2, 5]].copy()
-    pose[:, 3] = np.unwrap(pose[:, 3])  # unwrap yaw
-
-    end_pose = pose[-1]
-    delta_end = np.abs(pose - end_pose)
-    pos_delta = delta_end[:, :3].max(axis=1)
-    yaw_delta = delta_end[:, 3]
-
-    hist_end = max(1, int(hist_ratio * len(pos_delta)))
-    q_pos = np.percentile(pos_delta[:hist_end], 75)
-    q_yaw = np.percentile(yaw_delta[:hist_end], 75)
-    pos_th = max(q_pos * r_pos, pos_min)
-    yaw_th = max(q_yaw * r_yaw, yaw_min)
-
-    stable = (pos_delta < pos_th) & (yaw_delta < yaw_th)
-
-    stop_idx = len(stable) - 1
-    for i in range(len(stable) - k, -1, -1):
-        if stable[i : i + k].all():
-            stop_idx = i
-            continue  # 推到最早的稳定起点
-        break
-    return stop_idx + 1, pos_th, yaw_th
-
-
 def iter_episodes(raw_root: Path) -> Iterable[Path]:
     """
     遍历 datasets/raw/raw_data 下的所有 data.csv
@@ -110,7 +60,7 @@ def main() -> None:
             print(f"[SKIP] {csv_path}: {e}")
             continue
 
-        stop_frame, pos_th, yaw_th = find_stop_frame(actions)
+        stop_frame, pos_th, yaw_th = find_stop_frame(actions, mode="end", hist_ratio=0.8)
         gap = len(actions) - 1 - stop_frame
         rel = csv_path.relative_to(raw_root)
         print(
@@ -0,0 +1,207 @@
+"""
+Detect the start of the stable "end segment" of an episode from its actions
+(camera position xyz + yaw). Shared by split_csv.py, detect_stop_frames.py and
+trim_videos_from_stop.py.
+
+Two ways of measuring motion per frame:
+    "adjacent": |pose[i+1] - pose[i]|     (frame-to-frame deltas, N-1 values)
+    "end":      |pose[i] - pose[-1]|      (distance to the final pose, N values)
+
+A frame is stable when its pos delta (max over xyz) and yaw delta are both
+below the thresholds max(q75 * r, min), q75 being the 75th percentile over the
+first hist_ratio portion of the deltas. The stop frame is where the trailing
+run of stable deltas starts, provided that run is at least k long; the returned
+index is that delta index + 1 (kept identical to the original scripts).
+
+Everything is computed on a ragged batch (values + offsets) without per-frame
+Python loops, so many episodes are handled in one call:
+
+    values, offsets = concat_episodes([actions_0, actions_1, ...])
+    stop, pos_th, yaw_th = find_stop_frames(values, offsets, mode="end")
+
+find_stop_frame(actions) is the single-episode wrapper.
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+
+DELTA_MODES = ("adjacent", "end")
+
+
+def concat_episodes(episodes: Sequence[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """[(N_i, D)] -> (values (sum N_i, D), offsets (E+1,)), episode e is values[offsets[e]:offsets[e+1]]."""
+    lengths = np.array([len(a) for a in episodes], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    if not episodes:
+        return np.empty((0, 6), dtype=np.float64), offsets
+    return np.concatenate([np.asarray(a, dtype=np.float64) for a in episodes]), offsets
+
+
+def _segment_unwrap(phase: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """np.unwrap applied independently to every segment (starts = first index of each non-empty segment)."""
+    dd = np.diff(phase)
+    ddmod = np.mod(dd + np.pi, 2 * np.pi) - np.pi
+    ddmod[(ddmod == -np.pi) & (dd > 0)] = np.pi
+    correct = ddmod - dd
+    correct[np.abs(dd) < np.pi] = 0
+    # jumps across episode boundaries are not real
+    boundary = starts[starts > 0] - 1
+    correct[boundary] = 0
+    cum = np.concatenate([[0.0], np.cumsum(correct)])
+    seg_id = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(phase))))
+    return phase + (cum - cum[starts][seg_id])
+
+
+def _segment_percentile(values: np.ndarray, seg_id: np.ndarray, num_segments: int, q: float) -> np.ndarray:
+    """Per-segment np.percentile(..., q) with linear interpolation; empty segments give nan."""
+    # sort by value, then stable-sort by segment (integer keys -> radix sort); cheaper than np.lexsort
+    order = np.argsort(values)
+    order = order[np.argsort(seg_id[order], kind="stable")]
+    sorted_vals = values[order]
+    counts = np.bincount(seg_id, minlength=num_segments)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    out = np.full(num_segments, np.nan)
+    has = counts > 0
+    pos = (q / 100.0) * (counts[has] - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, counts[has] - 1)
+    frac = pos - lo
+    v_lo = sorted_vals[starts[has] + lo]
+    v_hi = sorted_vals[starts[has] + hi]
+    out[has] = v_lo + (v_hi - v_lo) * frac
+    return out
+
+
+class EpisodeDeltas(NamedTuple):
+    """Per-delta motion of all episodes with >= 2 frames, laid out as one ragged array."""
+
+    episodes: np.ndarray   # (E',) caller episode numbers of the kept episodes
+    lengths: np.ndarray    # (E',) frame counts
+    delta_len: np.ndarray  # (E',) delta counts (N-1 for "adjacent", N for "end")
+    d_starts: np.ndarray   # (E',) first delta of each episode
+    d_seg: np.ndarray      # (D,) episode of each delta (0..E'-1)
+    local: np.ndarray      # (D,) delta index within its episode
+    pos_delta: np.ndarray  # (D,) max |dx|, |dy|, |dz|
+    yaw_delta: np.ndarray  # (D,) |d yaw| after unwrapping
+
+
+def episode_deltas(values: np.ndarray, offsets: np.ndarray, mode: str = "end") -> EpisodeDeltas:
+    """Compute the pos / yaw deltas used for stability, for every episode with at least 2 frames."""
+    if mode not in DELTA_MODES:
+        raise ValueError(f"mode must be one of {DELTA_MODES}, got {mode!r}")
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    valid = lengths >= 2
+    ep_idx = np.flatnonzero(valid)
+    keep = np.repeat(valid, lengths)
+    lengths = lengths[valid]
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    ends = starts + lengths  # exclusive
+
+    pose = np.asarray(values, dtype=np.float64)[keep][:, [0, 1, 2, 5]]
+    if len(lengths):
+        pose[:, 3] = _segment_unwrap(pose[:, 3], starts)
+    frame_seg = np.repeat(np.arange(len(lengths)), lengths)
+
+    if mode == "adjacent":
+        delta = np.abs(np.diff(pose, axis=0))
+        # drop the diffs that straddle two episodes
+        delta = np.delete(delta, ends[:-1] - 1, axis=0)
+        delta_len = lengths - 1
+    else:
+        delta = np.abs(pose - pose[ends - 1][frame_seg])
+        delta_len = lengths
+
+    d_starts = np.concatenate([[0], np.cumsum(delta_len)[:-1]]).astype(np.int64)
+    d_seg = np.repeat(np.arange(len(delta_len)), delta_len)
+    local = np.arange(len(d_seg)) - d_starts[d_seg]
+    pos_delta = delta[:, :3].max(axis=1, initial=0.0)
+    return EpisodeDeltas(ep_idx, lengths, delta_len, d_starts, d_seg, local, pos_delta, delta[:, 3])
+
+
+def delta_quantiles(d: EpisodeDeltas, hist_ratio: float, q: float = 75) -> tuple[np.ndarray, np.ndarray]:
+    """Per-episode q-th percentile of pos / yaw deltas over the first hist_ratio part of each episode."""
+    hist_end = np.maximum(1, (hist_ratio * d.delta_len).astype(np.int64))
+    in_hist = d.local < hist_end[d.d_seg]
+    num = len(d.delta_len)
+    return (_segment_percentile(d.pos_delta[in_hist], d.d_seg[in_hist], num, q),
+            _segment_percentile(d.yaw_delta[in_hist], d.d_seg[in_hist], num, q))
+
+
+def find_stop_frames(
+    values: np.ndarray,
+    offsets: np.ndarray,
+    *,
+    mode: str = "end",
+    r_pos: float = 0,
+    r_yaw: float = 0,
+    pos_min: float = 0.2,
+    yaw_min: float = 0.4,
+    k: int = 2,
+    hist_ratio: float = 0.5,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Batched stop-frame detection.
+
+    values: (sum N_i, >=6) actions of all episodes concatenated, columns [x, y, z, roll, pitch, yaw].
+    offsets: (E+1,) episode boundaries (see concat_episodes).
+    Return (stop_frames int64 (E,), pos_thresholds (E,), yaw_thresholds (E,)).
+    Episodes shorter than 2 frames get stop frame 0 and the minimum thresholds.
+    """
+    if k < 1:
+        raise ValueError(f"k must be >= 1, got {k}")
+    d = episode_deltas(values, offsets, mode)
+
+    num_episodes = len(offsets) - 1
+    stop = np.zeros(num_episodes, dtype=np.int64)
+    pos_th = np.full(num_episodes, float(pos_min))
+    yaw_th = np.full(num_episodes, float(yaw_min))
+    if not len(d.episodes):
+        return stop, pos_th, yaw_th
+
+    # thresholds from the "normal motion" scale of the first hist_ratio part of each episode
+    pth = np.full(len(d.episodes), float(pos_min))
+    yth = np.full(len(d.episodes), float(yaw_min))
+    if r_pos or r_yaw:
+        q_pos, q_yaw = delta_quantiles(d, hist_ratio)
+        pth = np.maximum(q_pos * r_pos, pos_min)
+        yth = np.maximum(q_yaw * r_yaw, yaw_min)
+
+    stable = (d.pos_delta < pth[d.d_seg]) & (d.yaw_delta < yth[d.d_seg])
+
+    # length of the trailing all-stable run per episode: distance from the last unstable delta to the end
+    unstable_pos = np.where(stable, -1, d.local)
+    last_unstable = np.maximum.reduceat(unstable_pos, d.d_starts)
+    tail_run = d.delta_len - 1 - last_unstable
+    # the earliest start of a k-long stable window that is still followed only by stable deltas;
+    # if the tail is shorter than k, fall back to the last delta
+    stop_delta = np.where(tail_run >= k, d.delta_len - tail_run, d.delta_len - 1)
+
+    stop[d.episodes] = stop_delta + 1
+    pos_th[d.episodes] = pth
+    yaw_th[d.episodes] = yth
+    return stop, pos_th, yaw_th
+
+
+def find_stop_frame(
+    actions: np.ndarray,
+    *,
+    mode: str = "end",
+    r_pos: float = 0,
+    r_yaw: float = 0,
+    pos_min: float = 0.2,
+    yaw_min: float = 0.4,
+    k: int = 2,
+    hist_ratio: float = 0.5,
+) -> tuple[int, float, float]:
+    """Single-episode version of find_stop_frames: return (stop_frame, pos_threshold, yaw_threshold)."""
+    actions = np.asarray(actions)
+    stop, pos_th, yaw_th = find_stop_frames(
+        actions, np.array([0, len(actions)]),
+        mode=mode, r_pos=r_pos, r_yaw=r_yaw, pos_min=pos_min, yaw_min=yaw_min, k=k, hist_ratio=hist_ratio,
+    )
+    return int(stop[0]), float(pos_th[0]), float(yaw_th[0])
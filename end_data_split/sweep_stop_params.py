@@ -0,0 +1,266 @@
+"""
+Sweep the stop-frame parameters (r_pos, r_yaw, pos_min, yaw_min, k, hist_ratio) over a grid and report,
+for every setting, how the detected end segments are distributed over the whole dataset.
+
+Replaces "edit the defaults, rerun detect_stop_frames.py / trim_videos_from_stop.py, look at the output"
+with a single run:
+
+    python end_data_split/sweep_stop_params.py --data-root <dataset>/data --mode end \
+        --r-pos 0 0.1 0.2 --r-yaw 0 0.15 0.3 --pos-min 0.002 0.005 0.2 --yaw-min 0.005 0.01 0.4 \
+        --k 2 3 4 --hist-ratio 0.5 0.8 --output sweep.csv --target-ratio 0.2
+
+- all episode actions are read once and cached as a memmap (<dataset>/meta/stop_sweep_actions.npy + .json);
+  later runs reuse it as long as no parquet file was added, removed or modified
+- deltas / thresholds / stop frames for all settings are computed with broadcasting over a
+  (settings, episodes) grid, with no per-setting or per-episode Python loop:
+  the trailing stable run of an episode is the number of suffix maxima of its pos / yaw deltas that stay
+  below the thresholds, so it costs one binary search per distinct (hist_ratio, r, min) threshold and episode
+- results are identical to stop_frame.find_stop_frames for each setting
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deal_lerobot"))
+from parquet_io import read_vector_column  # noqa: E402
+
+from stop_frame import EpisodeDeltas, delta_quantiles, episode_deltas  # noqa: E402
+
+
+CACHE_NAME = "stop_sweep_actions"
+CACHE_VERSION = 1
+PARAM_NAMES = ("r_pos", "r_yaw", "pos_min", "yaw_min", "k", "hist_ratio")
+PERCENTILES = (10, 50, 90)
+
+
+# ------------------- action cache -------------------
+def _file_signature(files: list[Path], data_root: Path) -> list[list]:
+    sig = []
+    for f in files:
+        st = f.stat()
+        sig.append([f.relative_to(data_root).as_posix(), st.st_size, st.st_mtime_ns])
+    return sig
+
+
+def load_actions(data_root: Path, cache_dir: Path) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """
+    Return (values (sum N_i, 6) float64 memmap, offsets (E+1,), episode file names).
+    The actions of all parquet files under data_root are cached in cache_dir and only re-read when
+    the set of files or any file's size / mtime changes.
+    """
+    files = sorted(data_root.glob("chunk-*/*.parquet"))
+    signature = _file_signature(files, data_root)
+    npy_path = cache_dir / f"{CACHE_NAME}.npy"
+    json_path = cache_dir / f"{CACHE_NAME}.json"
+
+    if npy_path.exists() and json_path.exists():
+        with open(json_path, "r", encoding="utf-8") as fp:
+            index = json.load(fp)
+        if index.get("version") == CACHE_VERSION and index.get("files") == signature:
+            values = np.load(npy_path, mmap_mode="r")
+            return values, np.asarray(index["offsets"], dtype=np.int64), [s[0] for s in signature]
+
+    # footers give the row counts, so the memmap can be allocated up front and filled file by file
+    lengths = [pq.read_metadata(f).num_rows for f in files]
+    offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_npy = cache_dir / f"{CACHE_NAME}.tmp.npy"
+    values = np.lib.format.open_memmap(tmp_npy, mode="w+", dtype=np.float64, shape=(int(offsets[-1]), 6))
+    for f, lo, hi in zip(files, offsets[:-1], offsets[1:]):
+        actions = read_vector_column(f, "action")
+        if len(actions) != hi - lo:
+            raise ValueError(f"{f}: footer says {hi - lo} rows, read {len(actions)}")
+        values[lo:hi] = actions[:, :6]
+    values.flush()
+    del values
+    os.replace(tmp_npy, npy_path)
+
+    tmp_json = cache_dir / f"{CACHE_NAME}.json.tmp"
+    with open(tmp_json, "w", encoding="utf-8") as fp:
+        json.dump({"version": CACHE_VERSION, "files": signature, "offsets": offsets.tolist()}, fp)
+    os.replace(tmp_json, json_path)
+    print(f"Cached actions of {len(files)} episodes ({int(offsets[-1])} frames) -> {npy_path}")
+    return np.load(npy_path, mmap_mode="r"), offsets, [s[0] for s in signature]
+
+
+# ------------------- sweep -------------------
+def _suffix_max_keys(values: np.ndarray, d: EpisodeDeltas) -> tuple[np.ndarray, np.ndarray]:
+    """
+    For each episode, the running max of its deltas taken from the last delta backwards, encoded as
+    sorted int64 keys episode * U + rank(value) (U = number of distinct values), plus the sorted distinct
+    values. Ranks keep everything exact: "suffix max < t" <=> "rank < number of distinct values < t".
+    """
+    uniq, rank = np.unique(values, return_inverse=True)
+    rev = d.d_starts[d.d_seg] + (d.delta_len[d.d_seg] - 1 - d.local)
+    keys = d.d_seg.astype(np.int64) * len(uniq) + rank[rev]
+    # episode blocks are increasing, so a global running max restarts at every episode
+    return np.maximum.accumulate(keys), uniq
+
+
+def _count_below(keys: np.ndarray, uniq: np.ndarray, d: EpisodeDeltas, thresholds: np.ndarray) -> np.ndarray:
+    """thresholds (S, E') -> number of leading suffix maxima strictly below the threshold, per (setting, episode)."""
+    seg = np.arange(len(d.delta_len), dtype=np.int64)
+    query = seg * len(uniq) + np.searchsorted(uniq, thresholds, side="left")
+    return np.searchsorted(keys, query, side="left") - d.d_starts
+
+
+def param_grid(args: argparse.Namespace) -> dict[str, np.ndarray]:
+    """Cartesian product of the per-parameter value lists, as one array per parameter."""
+    combos = list(itertools.product(*(getattr(args, name) for name in PARAM_NAMES)))
+    columns = list(zip(*combos))
+    grid = {name: np.asarray(col, dtype=np.float64) for name, col in zip(PARAM_NAMES, columns)}
+    grid["k"] = grid["k"].astype(np.int64)
+    return grid
+
+
+def sweep(values: np.ndarray, offsets: np.ndarray, grid: dict[str, np.ndarray], mode: str,
+          chunk_elems: int = 1 << 24) -> dict[str, np.ndarray]:
+    """
+    Evaluate every setting of grid on every episode with >= 2 frames.
+    Return per-setting summary columns (see SUMMARY_COLUMNS), each of shape (S,).
+    """
+    d = episode_deltas(values, offsets, mode)
+    num_settings = len(grid["k"])
+    if np.any(grid["k"] < 1):
+        raise ValueError("k must be >= 1")
+    n_ep = len(d.episodes)
+    if n_ep == 0:
+        raise ValueError("no episode with at least 2 frames")
+
+    pos_keys, pos_uniq = _suffix_max_keys(d.pos_delta, d)
+    yaw_keys, yaw_uniq = _suffix_max_keys(d.yaw_delta, d)
+
+    # quantiles only depend on hist_ratio: compute them once per distinct value
+    ratios, ratio_idx = np.unique(grid["hist_ratio"], return_inverse=True)
+    need_q = np.any(grid["r_pos"] != 0) or np.any(grid["r_yaw"] != 0)
+    q_pos = np.zeros((len(ratios), n_ep))
+    q_yaw = np.zeros((len(ratios), n_ep))
+    if need_q:
+        for i, ratio in enumerate(ratios):
+            q_pos[i], q_yaw[i] = delta_quantiles(d, float(ratio))
+
+    # the pos threshold only depends on (hist_ratio, r_pos, pos_min) and the yaw threshold on
+    # (hist_ratio, r_yaw, yaw_min): count the stable tail once per distinct triple, not once per setting
+    def tail_counts(q, r, floor, keys, uniq):
+        triples, idx = np.unique(np.column_stack([ratio_idx, r, floor]), axis=0, return_inverse=True)
+        th = np.maximum(q[triples[:, 0].astype(np.int64)] * triples[:, 1:2], triples[:, 2:3])  # (T, E')
+        return _count_below(keys, uniq, d, th), idx.reshape(-1)
+
+    pos_count, pos_idx = tail_counts(q_pos, grid["r_pos"], grid["pos_min"], pos_keys, pos_uniq)
+    yaw_count, yaw_idx = tail_counts(q_yaw, grid["r_yaw"], grid["yaw_min"], yaw_keys, yaw_uniq)
+
+    summary: dict[str, np.ndarray] = {}
+    frames = d.lengths.astype(np.float64)
+    step = max(1, chunk_elems // n_ep)
+    for lo in range(0, num_settings, step):
+        sl = slice(lo, min(lo + step, num_settings))
+        # (S, E') per-setting tail runs; k broadcasts as (S, 1)
+        tail_run = np.minimum(pos_count[pos_idx[sl]], yaw_count[yaw_idx[sl]])
+
+        found = tail_run >= grid["k"][sl, None]
+        stop = np.where(found, d.delta_len - tail_run, d.delta_len - 1) + 1
+        tail = np.maximum(d.lengths - stop, 0)
+        ratio = tail / frames
+
+        chunk = {
+            "found": found.mean(axis=1),
+            "stop_mean": stop.mean(axis=1),
+            "tail_mean": tail.mean(axis=1),
+            "ratio_mean": ratio.mean(axis=1),
+        }
+        for name, arr in (("stop", stop), ("tail", tail), ("ratio", ratio)):
+            for p, v in zip(PERCENTILES, np.percentile(arr, PERCENTILES, axis=1)):
+                chunk[f"{name}_p{p}"] = v
+        for name, v in chunk.items():
+            summary.setdefault(name, []).append(v)
+    return {name: np.concatenate(parts) for name, parts in summary.items()}
+
+
+SUMMARY_COLUMNS = (
+    ["found", "stop_mean"] + [f"stop_p{p}" for p in PERCENTILES]
+    + ["tail_mean"] + [f"tail_p{p}" for p in PERCENTILES]
+    + ["ratio_mean"] + [f"ratio_p{p}" for p in PERCENTILES]
+)
+
+
+def write_csv(path: Path, grid: dict[str, np.ndarray], summary: dict[str, np.ndarray]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(list(PARAM_NAMES) + SUMMARY_COLUMNS)
+        params = np.column_stack([grid[name] for name in PARAM_NAMES]).tolist()
+        stats = np.column_stack([summary[name] for name in SUMMARY_COLUMNS]).tolist()
+        for p, s in zip(params, stats):
+            p[4] = int(p[4])
+            writer.writerow(p + [f"{v:.4f}" for v in s])
+
+
+def print_table(grid: dict[str, np.ndarray], summary: dict[str, np.ndarray], rows: np.ndarray) -> None:
+    header = ("r_pos  r_yaw  pos_min  yaw_min  k  hist  | found  stop_p50  "
+              "tail_p10/p50/p90    ratio_mean  ratio_p10/p50/p90")
+    print(header)
+    for i in rows:
+        print(
+            f"{grid['r_pos'][i]:5.3g}  {grid['r_yaw'][i]:5.3g}  {grid['pos_min'][i]:7.3g}  "
+            f"{grid['yaw_min'][i]:7.3g}  {grid['k'][i]:d}  {grid['hist_ratio'][i]:4.2f}  | "
+            f"{summary['found'][i]:5.1%}  {summary['stop_p50'][i]:8.1f}  "
+            f"{summary['tail_p10'][i]:5.1f}/{summary['tail_p50'][i]:5.1f}/{summary['tail_p90'][i]:5.1f}  "
+            f"{summary['ratio_mean'][i]:10.3f}  "
+            f"{summary['ratio_p10'][i]:.3f}/{summary['ratio_p50'][i]:.3f}/{summary['ratio_p90'][i]:.3f}"
+        )
+
+
+def main() -> None:
+    base_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Grid-search the stop-frame detection parameters.")
+    parser.add_argument("--data-root", type=Path, default=base_dir / "data",
+                        help="Directory containing chunk-*/episode_*.parquet.")
+    parser.add_argument("--cache-dir", type=Path, default=None,
+                        help="Where to keep the action memmap (default: <data-root>/../meta).")
+    parser.add_argument("--mode", choices=("adjacent", "end"), default="end",
+                        help="Delta mode: frame-to-frame (detect_stop_frames.py) or to the final pose "
+                             "(split_csv.py / trim_videos_from_stop.py).")
+    parser.add_argument("--r-pos", dest="r_pos", type=float, nargs="+", default=[0])
+    parser.add_argument("--r-yaw", dest="r_yaw", type=float, nargs="+", default=[0])
+    parser.add_argument("--pos-min", dest="pos_min", type=float, nargs="+", default=[0.2])
+    parser.add_argument("--yaw-min", dest="yaw_min", type=float, nargs="+", default=[0.4])
+    parser.add_argument("--k", type=int, nargs="+", default=[2])
+    parser.add_argument("--hist-ratio", dest="hist_ratio", type=float, nargs="+", default=[0.5])
+    parser.add_argument("--output", type=Path, default=None, help="Write one CSV row per setting.")
+    parser.add_argument("--target-ratio", type=float, default=None,
+                        help="Sort the printed settings by |median end-segment ratio - target|.")
+    parser.add_argument("--top", type=int, default=20, help="Number of settings to print.")
+    args = parser.parse_args()
+
+    cache_dir = args.cache_dir or args.data_root.resolve().parent / "meta"
+    values, offsets, files = load_actions(args.data_root, cache_dir)
+    if not files:
+        print("No parquet files found under", args.data_root)
+        return
+
+    grid = param_grid(args)
+    summary = sweep(values, offsets, grid, args.mode)
+    print(f"{len(files)} episodes, {len(grid['k'])} settings, mode={args.mode}")
+
+    if args.output:
+        write_csv(args.output, grid, summary)
+        print(f"Wrote {args.output}")
+
+    rows = np.arange(len(grid["k"]))
+    if args.target_ratio is not None:
+        rows = np.argsort(np.abs(summary["ratio_p50"] - args.target_ratio), kind="stable")
+    print_table(grid, summary, rows[: args.top])
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,11 @@ layout is preserved under an output root.
 
  LD_LIBRARY_PATH=/home/duanzhibo/ffmpeg/lib python datasets/dzb/our_data_test/trim_videos_from_stop.py   --ffmpeg-bin /home/duanzhibo/ffmpeg/bin/ffmpeg   --ffmpeg-libdir /home/duanzhibo/ffmpeg/lib   --output-root datasets/dzb/our_data_test/videos_trimmed   --annotate-root datasets/dzb/our_data_test/videos_annotated   --no-drawtext --skip-trim
 
+ffmpeg 调用由 run_jobs 调度：最多 --jobs 个 ffmpeg 进程同时运行，单个任务超过 --timeout 秒会被终止并计为失败；
+结果按 episode 顺序输出。编码器和 drawtext 支持只在启动时 probe 一次。
 
-核心可调参数及效果（都在 find_stop_frame 的默认值里改）：
+
+核心可调参数及效果（find_stop_frames 的参数，实现在 stop_frame.py）：
 
 r_pos, r_yaw（相对阈值系数）：减小→更苛刻，stop 更靠后；增大→更宽松，stop 更靠前。常用范围：r_pos 0.1–0.2，r_yaw 0.15–0.3。
 pos_min, yaw_min（绝对下限）：抬高→更宽松；降低→更苛刻。建议：pos_min 0.002–0.005（米），yaw_min 0.005–0.01（弧度）。
@@ -25,69 +28,39 @@ import argparse
 import os
 import shutil
 import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import NamedTuple
 
-import numpy as np
-import pandas as pd
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deal_lerobot"))
+from parquet_io import read_columns  # noqa: E402
 
+from stop_frame import concat_episodes, find_stop_frames  # noqa: E402
 
-def find_stop_frame(
-    actions: np.ndarray,
-    *,
-    r_pos: float = 0,
-    r_yaw: float = 0,
-    pos_min: float = 0.2,
-    yaw_min: float = 0.4,
-    k: int = 2,
-    hist_ratio: float = 0.5,
-) -> int:
-    """
-    Return the start index of the stable tail window (0-based).
-    """
-    if actions.shape[0] < 2:
-        return 0
-
-    pose = actions[:, [0, 1, 2, 5]].copy()
-    pose[:, 3] = np.unwrap(pose[:, 3])  # unwrap yaw to avoid jumps
-
-    # Compare每帧到最终帧的差异（而非相邻帧差异），确保末尾段和最终画面接近。
-    end_pose = pose[-1]
-    delta_end = np.abs(pose - end_pose)
-    pos_delta = delta_end[:, :3].max(axis=1)
-    yaw_delta = delta_end[:, 3]
-
-    hist_end = max(1, int(hist_ratio * len(pos_delta)))
-    q_pos = np.percentile(pos_delta[:hist_end], 75)
-    q_yaw = np.percentile(yaw_delta[:hist_end], 75)
-    pos_th = max(q_pos * r_pos, pos_min)
-    yaw_th = max(q_yaw * r_yaw, yaw_min)
-    # print("pos_th:",pos_th)
-    # print("yaw_th:",yaw_th)
-    stable = (pos_delta < pos_th) & (yaw_delta < yaw_th)
-    # print("stable:",stable)
-    stop_idx = len(stable) - 1
-    # print("len(stable):",len(stable))
-    for i in range(len(stable) - k, -1, -1):
-        if stable[i : i + k].all():
-            stop_idx = i
-            continue
-        break
-    # assert False
-    return stop_idx + 1  # convert delta index to frame index
 
+class FfmpegJob(NamedTuple):
+    """One ffmpeg invocation; label is used in the log, kind in the summary ("trim" / "annotate")."""
 
-def trim_video(
-    in_path: Path,
-    out_path: Path,
-    start_time: float,
-    ffmpeg_bin: str,
-    env: dict[str, str] | None,
-) -> bool:
+    kind: str
+    label: str
+    cmd: list[str]
+    out_path: Path
+
+
+class JobResult(NamedTuple):
+    job: FfmpegJob
+    ok: bool
+    elapsed: float
+    error: str
+
+
+def trim_command(in_path: Path, out_path: Path, start_time: float, ffmpeg_bin: str) -> list[str]:
     """
-    Trim input video from start_time to end, copying stream. Returns success.
+    Trim input video from start_time to end, copying stream.
     """
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    cmd = [
+    return [
         ffmpeg_bin,
         "-y",
         "-loglevel",
@@ -100,11 +73,60 @@ def trim_video(
         "copy",
         str(out_path),
     ]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-    if result.returncode != 0:
-        print(f"[FAIL] {in_path.name}: ffmpeg error -> {result.stderr.decode(errors='ignore')[:300]}")
-        return False
-    return True
+
+
+def run_job(job: FfmpegJob, env: dict[str, str] | None, timeout: float | None) -> JobResult:
+    """
+    Run one ffmpeg job; a job that exceeds timeout is killed. A failed job leaves no partial output.
+    """
+    t0 = time.monotonic()
+    try:
+        job.out_path.parent.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        return JobResult(job, False, time.monotonic() - t0, f"cannot create output directory -> {e}")
+    try:
+        result = subprocess.run(job.cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, timeout=timeout)
+        ok = result.returncode == 0
+        error = "" if ok else f"ffmpeg error -> {result.stderr.decode(errors='ignore')[:300]}"
+    except subprocess.TimeoutExpired:
+        ok, error = False, f"timed out after {timeout:g}s"
+    except OSError as e:
+        ok, error = False, f"failed to start ffmpeg -> {e}"
+    if not ok:
+        job.out_path.unlink(missing_ok=True)
+    return JobResult(job, ok, time.monotonic() - t0, error)
+
+
+def run_jobs(
+    jobs: list[FfmpegJob],
+    env: dict[str, str] | None,
+    max_workers: int,
+    timeout: float | None,
+) -> list[JobResult]:
+    """
+    Run jobs with at most max_workers ffmpeg processes at a time.
+    Threads only wait on the child processes, so the ffmpeg processes themselves run in parallel.
+    Results are logged and returned in job order, regardless of completion order.
+    """
+    results = []
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        futures = [pool.submit(run_job, job, env, timeout) for job in jobs]
+        for future in futures:
+            res = future.result()
+            if res.ok:
+                print(f"[OK] {res.job.label} ({res.elapsed:.1f}s)")
+            else:
+                print(f"[FAIL] {res.job.label}: {res.error}")
+            results.append(res)
+    except BaseException:
+        # Ctrl-C or an unexpected error: drop the queued jobs instead of running them all before exiting;
+        # ffmpeg processes already started get the same SIGINT from the terminal.
+        pool.shutdown(wait=False, cancel_futures=True)
+        print(f"Aborted: {len(results)}/{len(jobs)} jobs finished, queued jobs cancelled.")
+        raise
+    pool.shutdown()
+    return results
 
 
 def ffmpeg_supports_drawtext(ffmpeg_bin: str, env: dict[str, str] | None) -> bool:
@@ -148,26 +170,36 @@ def pick_encoder(ffmpeg_bin: str, env: dict[str, str] | None) -> tuple[list[str]
     return (["-pix_fmt", "yuv420p"], "default")
 
 
-def annotate_video(
+class FfmpegCaps(NamedTuple):
+    """What the ffmpeg binary can do; probed once in main and shared by every annotate job."""
+
+    encoder_opts: list[str]
+    encoder_name: str
+    use_drawtext: bool
+
+
+def probe_ffmpeg(ffmpeg_bin: str, env: dict[str, str] | None, want_drawtext: bool = True) -> FfmpegCaps:
+    encoder_opts, encoder_name = pick_encoder(ffmpeg_bin, env)
+    use_drawtext = want_drawtext and ffmpeg_supports_drawtext(ffmpeg_bin, env)
+    return FfmpegCaps(encoder_opts, encoder_name, use_drawtext)
+
+
+def annotate_command(
     in_path: Path,
     out_path: Path,
     start_time: float,
     ffmpeg_bin: str,
-    env: dict[str, str] | None,
+    caps: FfmpegCaps,
     fontfile: Path | None = None,
-    use_drawtext: bool = True,
-    encoder_opts: list[str] | None = None,
-) -> bool:
+) -> list[str]:
     """
     Save full-length video but overlay a marker indicating the stop time.
     - Persistent text label (optional, requires drawtext filter).
     - Semi-transparent band appears from start_time onward.
     """
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-
     band_filter = f"drawbox=x=0:y=0:w=iw:h=48:color=red@0.35:t=fill:enable='gte(t,{start_time})'"
     filters = [band_filter]
-    if use_drawtext:
+    if caps.use_drawtext:
         text = f"STOP >= {start_time:.2f}s"
         font_opt = f":fontfile={fontfile}" if fontfile else ""
         filters.append(
@@ -185,14 +217,9 @@ def annotate_video(
         "-vf",
         vf,
     ]
-    if encoder_opts:
-        cmd.extend(encoder_opts)
+    cmd.extend(caps.encoder_opts)
     cmd.extend(["-c:a", "copy", str(out_path)])
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-    if result.returncode != 0:
-        print(f"[FAIL] annotate {in_path.name}: ffmpeg error -> {result.stderr.decode(errors='ignore')[:300]}")
-        return False
-    return True
+    return cmd
 
 
 def main() -> None:
@@ -231,6 +258,18 @@ def main() -> None:
         action="store_true",
         help="Disable drawtext overlay; only draw the band (useful if ffmpeg lacks drawtext).",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Maximum number of ffmpeg processes running at the same time (default: CPU count).",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600,
+        help="Per-job timeout in seconds; a job running longer is killed and counted as failed (<=0: no limit).",
+    )
     args = parser.parse_args()
 
     if shutil.which(args.ffmpeg_bin) is None and not Path(args.ffmpeg_bin).exists():
@@ -250,14 +289,13 @@ def main() -> None:
         prev = ff_env.get("LD_LIBRARY_PATH", "")
         ff_env["LD_LIBRARY_PATH"] = f"{args.ffmpeg_libdir}{':' + prev if prev else ''}"
 
-    # Detect drawtext availability unless user turned it off.
-    use_drawtext = not args.no_drawtext
-    if use_drawtext and not ffmpeg_supports_drawtext(args.ffmpeg_bin, ff_env):
-        print("drawtext filter not available in this ffmpeg; falling back to band-only overlay.")
-        use_drawtext = False
-
-    encoder_opts, encoder_name = pick_encoder(args.ffmpeg_bin, ff_env)
-    print(f"Using encoder: {encoder_name} ({' '.join(encoder_opts)})")
+    # Probe encoder / drawtext support once; every annotate job shares the result.
+    caps = None
+    if annotate_root:
+        caps = probe_ffmpeg(args.ffmpeg_bin, ff_env, want_drawtext=not args.no_drawtext)
+        if not args.no_drawtext and not caps.use_drawtext:
+            print("drawtext filter not available in this ffmpeg; falling back to band-only overlay.")
+        print(f"Using encoder: {caps.encoder_name} ({' '.join(caps.encoder_opts)})")
 
     parquet_files = sorted(data_root.glob("chunk-*/*.parquet"))
     if not parquet_files:
@@ -265,17 +303,17 @@ def main() -> None:
         return
 
     total = len(parquet_files)
-    ok_trim = 0
-    ok_ann = 0
     skipped = 0
 
-    for f in parquet_files:
-        df = pd.read_parquet(f)
-        actions = np.vstack(df["action"].to_numpy())
-        stop_frame = find_stop_frame(actions)
-        if stop_frame >= len(df):
-            stop_frame = len(df) - 1
-        start_ts = float(df.iloc[stop_frame]["timestamp"])
+    episodes = [read_columns(f, ["action", "timestamp"]) for f in parquet_files]
+    values, offsets = concat_episodes([columns["action"] for columns in episodes])
+    stop_frames, _, _ = find_stop_frames(values, offsets, mode="end", hist_ratio=0.5)
+
+    jobs = []
+    for f, columns, stop_frame in zip(parquet_files, episodes, stop_frames.tolist()):
+        if stop_frame >= len(columns["action"]):
+            stop_frame = len(columns["action"]) - 1
+        start_ts = float(columns["timestamp"][stop_frame])
 
         chunk_dir = f.parent.name
         stem = f.stem  # episode_xxxxxx
@@ -284,32 +322,27 @@ def main() -> None:
             print(f"[SKIP] video not found for {f.name}: {in_video}")
             skipped += 1
             continue
+        info = f"stop_frame={stop_frame}, start_ts={start_ts:.3f}"
         if not args.skip_trim:
             out_video = out_root / f"{stem}.mp4"
-            if trim_video(in_video, out_video, start_ts, ffmpeg_bin=args.ffmpeg_bin, env=ff_env):
-                ok_trim += 1
-                print(f"[OK] trimmed {f.name}: stop_frame={stop_frame}, start_ts={start_ts:.3f} -> {out_video}")
-            else:
-                skipped += 1
+            cmd = trim_command(in_video, out_video, start_ts, args.ffmpeg_bin)
+            jobs.append(FfmpegJob("trim", f"trimmed {f.name}: {info} -> {out_video}", cmd, out_video))
         if annotate_root:
             ann_video = annotate_root / f"{stem}.mp4"
-            if annotate_video(
-                in_video,
-                ann_video,
-                start_ts,
-                ffmpeg_bin=args.ffmpeg_bin,
-                env=ff_env,
-                fontfile=fontfile,
-                use_drawtext=use_drawtext,
-                encoder_opts=encoder_opts,
-            ):
-                ok_ann += 1
-                print(f"[OK] annotated {f.name}: stop_frame={stop_frame}, start_ts={start_ts:.3f} -> {ann_video}")
-            else:
-                skipped += 1
-
+            cmd = annotate_command(in_video, ann_video, start_ts, args.ffmpeg_bin, caps, fontfile)
+            jobs.append(FfmpegJob("annotate", f"annotated {f.name}: {info} -> {ann_video}", cmd, ann_video))
+
+    timeout = args.timeout if args.timeout > 0 else None
+    print(f"Running {len(jobs)} ffmpeg jobs, {args.jobs} at a time.")
+    results = run_jobs(jobs, ff_env, args.jobs, timeout)
+
+    ok_trim = sum(r.ok for r in results if r.job.kind == "trim")
+    ok_ann = sum(r.ok for r in results if r.job.kind == "annotate")
+    failed = [r for r in results if not r.ok]
+    skipped += len(failed)
+    for r in failed:
+        print(f"  failed: {r.job.out_path.name} ({r.job.kind}): {r.error.splitlines()[0] if r.error else ''}")
     print(f"Done. trimmed={ok_trim}, annotated={ok_ann}, skipped={skipped}, total={total}")
 
-
 if __name__ == "__main__":
     main()
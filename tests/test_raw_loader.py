@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deal_lerobot"))
+import raw_loader  # noqa: E402
+from parquet_io import fixed_size_list_array  # noqa: E402
+
+
+def write_csv(path, bbox_rows):
+    header = raw_loader.POS_COLUMNS + raw_loader.QUAT_COLUMNS + raw_loader.BBOX_COLUMNS
+    lines = [",".join(header)]
+    for i, bbox in enumerate(bbox_rows):
+        lines.append(",".join([f"{0.1 * i}", "2.5", "-1.25", "0", "0", "0", "1"] + [str(v) for v in bbox]))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_fractional_bbox_is_not_rounded(tmp_path):
+    # sync_bbox_from_json.py 可能写入非整数坐标
+    bbox = [[12, 34.5, 100.125, 999.9999999], [0, 0, 0, 0]]
+    csv_path = tmp_path / "data.csv"
+    write_csv(csv_path, bbox)
+
+    episode = raw_loader.load_raw_episode(csv_path)
+    assert episode["bbox"].dtype == np.float64
+    np.testing.assert_array_equal(episode["bbox"], np.array(bbox, dtype=np.float64))
+    assert episode["pos"].dtype == np.float64
+    np.testing.assert_array_equal(episode["quat"][:, 3], [1, 1])
+
+    # 只有写 FixedSizeList<float32> 时才转 float32
+    column = fixed_size_list_array(episode["bbox"])
+    assert str(column.type.value_type) == "float"
+    np.testing.assert_allclose(column.flatten().to_numpy().reshape(-1, 4), bbox, rtol=1e-7)
+
+
+def test_column_types_override(tmp_path):
+    csv_path = tmp_path / "data.csv"
+    write_csv(csv_path, [[1.5, 2, 3, 4]])
+    cols = raw_loader.read_raw_columns(csv_path, ["bbox_x1"], column_types={"bbox_x1": pa.float32()})
+    assert cols["bbox_x1"].dtype == np.float32
+    assert cols["bbox_x1"][0] == np.float32(1.5)
@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deal_lerobot"))
+import stats_utils  # noqa: E402
+
+
+pytest.importorskip("av")
+
+NUM_FRAMES = 240
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    """平滑移动的渐变画面，mp4v 编码后有 P 帧（关键帧间隔 > 1）。"""
+    path = str(tmp_path_factory.mktemp("video") / "episode_000000.mp4")
+    yy, xx = np.mgrid[0:120, 0:160]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 5, (160, 120))
+    for i in range(NUM_FRAMES):
+        frame = np.stack([(xx + i) % 256, (yy + 2 * i) % 256, ((xx + yy) // 2 + 3 * i) % 256], -1)
+        writer.write(frame.astype(np.uint8))
+    writer.release()
+    return path
+
+
+def exact_frame_means(path):
+    cap = cv2.VideoCapture(path)
+    means = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        means.append(stats_utils.frame_channel_means(frame))
+    cap.release()
+    return np.array(means)
+
+
+@pytest.mark.parametrize("frame_step, num_samples", [(40, 0), (1, 8)])
+def test_sampled_stats_decode_fewer_frames(video, frame_step, num_samples):
+    decoder = stats_utils.SampledFrameDecoder(video)
+    assert decoder.total_frames == NUM_FRAMES
+    assert 1 < len(decoder.keyframes) < NUM_FRAMES
+    decoder.close()
+
+    stats, total, decoded = stats_utils._sample_stats_pyav(video, frame_step, num_samples, 1, 0)
+    wanted = stats_utils.sample_frame_indices(total, frame_step, num_samples, 0)
+    assert total == NUM_FRAMES
+    assert stats.count == len(wanted)
+    # 跳过的帧不解码：解码帧数远少于总帧数，且不超过 “每个目标帧 + 它前面的一个 GOP”
+    assert decoded < NUM_FRAMES // 2
+    # seek 后取到的正是目标帧
+    np.testing.assert_allclose(stats.mean, exact_frame_means(video)[wanted].mean(axis=0), atol=1e-9)
+
+
+def test_pixel_step_downscales_in_decoder(video):
+    decoder = stats_utils.SampledFrameDecoder(video, pixel_step=4)
+    frames = list(decoder.frames([0, 100]))
+    decoder.close()
+    assert [i for i, _ in frames] == [0, 100]
+    assert all(frame.shape == (30, 40, 3) for _, frame in frames)
+
+    stats, _, _ = stats_utils._sample_stats_pyav(video, 40, 0, 4, 0)
+    wanted = stats_utils.sample_frame_indices(NUM_FRAMES, 40)
+    np.testing.assert_allclose(stats.mean, exact_frame_means(video)[wanted].mean(axis=0), atol=0.02)
@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deal_lerobot"))
+from task_registry import TaskRegistry  # noqa: E402
+
+
+def test_save_bare_filename_and_reload(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    registry = TaskRegistry()
+    assert registry.task_index("pick  the cup") == 0
+    assert registry.task_index("open the door") == 1
+    registry.save("reg.json")  # 没有目录部分
+
+    loaded = TaskRegistry.load("reg.json")
+    assert loaded.tasks() == registry.tasks()
+    # 规范化后相同的指令沿用原编号，新指令接着分配
+    assert loaded.task_index(" pick the cup ") == 0
+    assert loaded.task_index("close the door") == 2
+
+
+def test_save_creates_parent_dirs(tmp_path):
+    path = tmp_path / "meta" / "task_registry.json"
+    registry = TaskRegistry([{"task_index": 3, "task": "go"}])
+    registry.save(str(path))
+    assert TaskRegistry.load(str(path)).task_index("new") == 4